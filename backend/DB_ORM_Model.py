@@ -1,5 +1,5 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import DDL, BigInteger, Column, DateTime, ForeignKey, Integer, String, Float, Index, event
 Base = declarative_base()  #this is used to map using the ORM
 
 
@@ -12,4 +12,137 @@ class Product(Base):
     price= Column(Integer)        
     quantity = Column(Integer)  
 
+    # Row version for the delta sync (GET /products/changes, see sync.py)
+    # Every write stamps it (the transaction id on Postgres); rows from before have 0.
+    # An existing database needs these once (create_all adds missing tables,
+    # never missing columns; with DB_CREATE_SCHEMA=0 run all of them):
+    #   ALTER TABLE "Product" ADD COLUMN version BIGINT NOT NULL DEFAULT 0;
+    #   ALTER TABLE "Product" ADD COLUMN updated_at TIMESTAMP;
+    #   CREATE INDEX "ix_Product_version_id" ON "Product" (version, id);
+    #   CREATE TABLE "ProductTombstone" (
+    #       product_id INTEGER PRIMARY KEY,
+    #       version BIGINT NOT NULL,
+    #       deleted_at TIMESTAMP NOT NULL);
+    #   CREATE INDEX "ix_ProductTombstone_version_product_id" ON "ProductTombstone" (version, product_id);
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime)  # UTC
 
+    # Indexes for the sorted / paginated products list
+    # ---------------------------------------------------------
+    # GET /products pages with "ORDER BY <field>, id" and "WHERE (<field>, id) > (...)",
+    # so each sortable field gets a composite index ending with id.
+    # Sorting by id alone already uses the primary key index.
+    #
+    # The quantity index also carries price (INCLUDE, Postgres only): the stock
+    # statistics (SUM(price * quantity), ...) can then be answered from the index
+    # alone, without reading the table rows. The low-stock list uses the same
+    # index as a range scan on quantity.
+    __table_args__ = (
+        Index("ix_Product_name_id", "name", "id"),
+        Index("ix_Product_price_id", "price", "id"),
+        Index("ix_Product_quantity_id", "quantity", "id", postgresql_include=["price"]),
+        Index("ix_Product_version_id", "version", "id"),  # GET /products/changes
+    )
+
+
+
+
+# Stock movements — the append-only LEDGER
+# ---------------------------------------------------------
+# Every change of Product.quantity is written here as one row
+# (receipt +10, sale -2, adjustment -1, ...). Rows are only ever INSERTED,
+# never updated or deleted, so the full history is kept.
+#
+# Product.quantity is still the "current stock": it is moved by the same
+# delta in the same transaction (see ledger.py), it is never recomputed.
+#
+# product_id has no foreign key on purpose: deleting a product keeps its history.
+class StockMovement(Base):
+    __tablename__ = "StockMovement"
+    # BIGINT in Postgres (the ledger gets big), INTEGER in SQLite (needed for autoincrement)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)        # receipt / sale / adjustment / opening / removal
+    delta = Column(Integer, nullable=False)      # + goes in, - goes out
+    created_at = Column(DateTime, nullable=False)  # UTC
+    reference = Column(String)                   # optional: order number, supplier note, ...
+
+    __table_args__ = (
+        Index("ix_StockMovement_product_id_id", "product_id", "id"),                  # tail after a snapshot
+        Index("ix_StockMovement_product_id_created_at", "product_id", "created_at"),  # per-period totals
+    )
+
+
+# Stock snapshots — checkpoints of the ledger
+# ---------------------------------------------------------
+# "product X had <quantity> after all movements up to <last_movement_id>".
+# Stock at time T = latest snapshot before T + the few movements after it,
+# so the whole ledger never has to be summed.
+class StockSnapshot(Base):
+    __tablename__ = "StockSnapshot"
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    last_movement_id = Column(BigInteger, nullable=False)
+    taken_at = Column(DateTime, nullable=False)  # UTC
+
+    __table_args__ = (
+        Index("ix_StockSnapshot_product_id_taken_at", "product_id", "taken_at"),
+    )
+
+
+# Tombstones — deleted products, for the delta sync
+# ---------------------------------------------------------
+# A deleted product has no row left to carry a version, so the delete
+# leaves this row behind: "product_id was deleted at version N".
+class ProductTombstone(Base):
+    __tablename__ = "ProductTombstone"
+    product_id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime, nullable=False)  # UTC
+
+    __table_args__ = (
+        Index("ix_ProductTombstone_version_product_id", "version", "product_id"),
+    )
+
+
+# Warehouses — the locations that hold stock
+class Warehouse(Base):
+    __tablename__ = "Warehouse"
+    id = Column(Integer, primary_key=True)
+    code = Column(String, nullable=False, unique=True)   # short name, e.g. "BLR-1"
+    name = Column(String)
+
+
+# Stock per warehouse — one row per (warehouse, product)
+# ---------------------------------------------------------
+# Postgres: the table is PARTITIONED BY LIST (warehouse_id), one partition per
+# warehouse (created with the warehouse, see warehouses.py). Each warehouse
+# then has its own table and indexes underneath:
+#   - a scan of one warehouse only reads its own partition (partition pruning)
+#   - busy warehouses do not share index pages / vacuum work with each other
+#   - a closed warehouse can be detached or dropped as a whole
+# Other databases (SQLite in local runs) get a normal table.
+#
+# Product.quantity is not touched by this table: it stays the global number
+# of the routes above; the totals over all warehouses are summed when asked
+# (GET /warehouses/rollup, GET /products/{id}/locations).
+class WarehouseStock(Base):
+    __tablename__ = "WarehouseStock"
+    warehouse_id = Column(Integer, ForeignKey("Warehouse.id"), primary_key=True)  # the partition key
+    product_id = Column(Integer, primary_key=True)   # no foreign key, like the ledger
+    quantity = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)                    # UTC
+
+    __table_args__ = (
+        Index("ix_WarehouseStock_product_id", "product_id"),   # rollups of one product over all warehouses
+        {"postgresql_partition_by": "LIST (warehouse_id)"},
+    )
+
+
+# Postgres: rows of a warehouse that has no partition yet land here instead of failing
+event.listen(
+    WarehouseStock.__table__, "after_create",
+    DDL('CREATE TABLE IF NOT EXISTS "WarehouseStock_default" PARTITION OF "WarehouseStock" DEFAULT')
+    .execute_if(dialect="postgresql"),
+)
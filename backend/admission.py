@@ -0,0 +1,223 @@
+#this file has the ADMISSION CONTROL of the app (load shedding under overload)
+#only a fixed number of requests run at the same time, a few more may wait,
+#and the rest get a fast "503 try again" instead of making everybody slow
+
+# How it works
+# ---------------------------------------------------------
+# ADMISSION_MAX_CONCURRENCY=N turns it on (0 = off, the default).
+#
+#   request ─► free slot?  yes ─► runs
+#                          no  ─► wait queue (at most ADMISSION_MAX_QUEUE requests)
+#                                   ├─ a slot frees up → the most important waiter runs
+#                                   ├─ waited ADMISSION_MAX_WAIT_MS → 503
+#                                   └─ queue full → 503 for the least important one
+#
+# Without a limit a spike piles up thousands of requests on the database pool,
+# every one of them gets slow, clients time out and retry, and it gets worse.
+# With a limit the requests that run stay fast, and the ones that cannot be
+# served soon are told so at once (503 + Retry-After), so a load balancer or
+# client can retry later or elsewhere.
+#
+# Priorities (PRIORITY_RULES below, first match wins)
+#   0 high   → stock adjustments (also per warehouse) and movements: a sale must not wait for a report
+#   1 normal → everything else (single products, search, writes)
+#   2 low    → full listings, export, stats
+# A waiting high priority request is always admitted before a normal or
+# low one, and when the queue is full a low one is dropped to make room.
+#
+# Never limited: health probes, /metrics (we must see the overload), the
+# event stream (long lived, it would hold a slot forever) and CORS preflights.
+#
+# A good limit is about the database pool size (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+# plus a few for cached answers; GET /admission shows the current numbers.
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import re
+import time
+from collections import Counter
+
+from fastapi import APIRouter
+
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "0"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "100"))
+ADMISSION_MAX_WAIT_MS = float(os.getenv("ADMISSION_MAX_WAIT_MS", "1000"))
+RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+HIGH, NORMAL, LOW = 0, 1, 2
+PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+# (methods, path regex, priority); None = not limited at all
+PRIORITY_RULES = [
+    ({"GET"}, re.compile(r"^/(healthz|readyz|metrics(/.*)?)$"), None),
+    ({"GET"}, re.compile(r"^/products/stream$"), None),
+    ({"POST"}, re.compile(r"^/products/(\d+/)?adjust$"), HIGH),
+    ({"POST"}, re.compile(r"^/movements$"), HIGH),
+    ({"POST"}, re.compile(r"^/warehouses/\d+/(stock/\d+/)?adjust$"), HIGH),
+    ({"GET"}, re.compile(r"^/products/?$"), LOW),
+    ({"GET"}, re.compile(r"^/products/(export|stats|low-stock)$"), LOW),
+]
+
+
+def priority_of(method, path):
+    if method == "OPTIONS":
+        return None
+    for methods, pattern, priority in PRIORITY_RULES:
+        if method in methods and pattern.match(path):
+            return priority
+    return NORMAL
+
+
+class AdmissionController:
+    def __init__(self, limit=ADMISSION_MAX_CONCURRENCY, max_queue=ADMISSION_MAX_QUEUE,
+                 max_wait_ms=ADMISSION_MAX_WAIT_MS):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait_ms / 1000
+        self.in_flight = 0
+        self.queued = 0
+        self._waiters = []          # heap of (priority, arrival number, future)
+        self._arrivals = itertools.count()
+
+        self.admitted = Counter()   # priority → requests that ran
+        self.shed = Counter()       # (priority, reason) → requests answered with 503
+        self.max_queued = 0
+        self.wait_seconds = 0.0     # total time admitted requests spent in the queue
+        self.waited = 0             # admitted requests that had to wait
+
+    # Wait for a slot. True → run the request (call release() after), False → 503.
+    async def acquire(self, priority):
+        if self.in_flight < self.limit and not self.queued:
+            self.in_flight += 1
+            self.admitted[priority] += 1
+            return True
+
+        if self.queued >= self.max_queue and not self._drop_lower_than(priority):
+            self.shed[priority, "queue full"] += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._arrivals), future))
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        started = time.perf_counter()
+
+        try:
+            admitted = await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self.queued -= 1
+                self.shed[priority, "timeout"] += 1
+                return False
+            admitted = future.result()  # decided just as the wait ran out
+        except asyncio.CancelledError:  # the client went away while waiting
+            if not future.done():
+                future.cancel()
+                self.queued -= 1
+            elif future.result():
+                self.release()  # a slot was handed over just now → pass it on
+            raise
+
+        if admitted:
+            self.admitted[priority] += 1
+            self.waited += 1
+            self.wait_seconds += time.perf_counter() - started
+        return admitted
+
+    # A request finished: hand its slot to the most important waiter
+    def release(self):
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.limit:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():       # timed out / dropped already
+                continue
+            self.queued -= 1
+            self.in_flight += 1
+            future.set_result(True)
+
+    # Queue full: drop the least important (and newest) waiter, if it is
+    # less important than the new request
+    def _drop_lower_than(self, priority):
+        waiting = [entry for entry in self._waiters if not entry[2].done()]
+        if not waiting:
+            return False
+        worst = max(waiting, key=lambda entry: (entry[0], entry[1]))
+        if worst[0] <= priority:
+            return False
+        worst[2].set_result(False)
+        self.queued -= 1
+        self.shed[worst[0], "dropped for higher priority"] += 1
+        self._waiters = waiting
+        self._waiters.remove(worst)
+        heapq.heapify(self._waiters)
+        return True
+
+    def snapshot(self):
+        return {
+            "enabled": self.limit > 0,
+            "max_concurrency": self.limit,
+            "max_queue": self.max_queue,
+            "max_wait_ms": self.max_wait * 1000,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "admitted": {PRIORITY_NAMES[p]: n for p, n in sorted(self.admitted.items())},
+            "shed": [{"priority": PRIORITY_NAMES[p], "reason": reason, "count": n}
+                     for (p, reason), n in sorted(self.shed.items())],
+            "avg_wait_ms": round(self.wait_seconds / self.waited * 1000, 3) if self.waited else 0.0,
+        }
+
+
+controller = AdmissionController()
+
+
+# The middleware (pure ASGI, added in main.py)
+# ---------------------------------------------------------
+class AdmissionMiddleware:
+    def __init__(self, app, controller=controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.controller.limit <= 0:
+            return await self.app(scope, receive, send)
+
+        priority = priority_of(scope["method"], scope["path"])
+        if priority is None:
+            return await self.app(scope, receive, send)
+
+        if not await self.controller.acquire(priority):
+            return await busy_response(send)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+
+async def busy_response(send):
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"retry-after", str(RETRY_AFTER_SECONDS).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": b'{"detail":"server busy, try again later"}'})
+
+
+# ======================================================================
+# GET: Admission control statistics
+# ======================================================================
+@router.get("/admission")
+async def Admission_stats():
+    return controller.snapshot()
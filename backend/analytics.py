@@ -0,0 +1,142 @@
+#this file has the DASHBOARD numbers: stock value, low-stock products, distributions
+#the database does the math (SUM, COUNT, GROUP BY), only the small result comes back
+
+# Before, the dashboard downloaded every product and looped over them in the browser.
+# Here every number is one aggregate query:
+#     SELECT COUNT(*), SUM(quantity), SUM(price * quantity), MIN(price), ... FROM "Product"
+# and the low-stock list is a range scan on the (quantity, id) index.
+#
+# Results are cached for a few seconds (STATS_CACHE_TTL), so a wall of open
+# dashboards does not run the same aggregate again and again.
+# ?fresh=true skips the cache.
+
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Query, Response
+from sqlalchemy import BigInteger, Integer, case, cast, func, select
+
+from replicas import open_read_session
+from pagination import keyset_query, page_result
+from models import ProductPage
+from serialization import product_columns, product_row_to_dict, to_json
+import DB_ORM_Model
+import cache
+
+
+router = APIRouter()
+
+Product = DB_ORM_Model.Product
+
+# Seconds the stats stay cached (0 = no cache)
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "5"))
+
+# Number of buckets in the price / quantity histograms
+HISTOGRAM_BUCKETS = 10
+
+
+def as_number(value):
+    # SUM / AVG come back as Decimal in Postgres → plain int / float for JSON
+    if value is None:
+        return None
+    return int(value) if value == int(value) else round(float(value), 4)
+
+
+# Histogram of one column
+# ---------------------------------------------------------
+# The range [low, high] is cut into `buckets` equal parts and the database
+# counts the rows in each part (GROUP BY bucket number).
+async def histogram(db, column, low, high, buckets=HISTOGRAM_BUCKETS):
+    if low is None or high is None:
+        return []
+
+    width = max((high - low + 1) / buckets, 1)
+    # FLOOR first: CAST alone rounds on Postgres (9.6 → 10) and only cuts off on SQLite.
+    # A value written after low / high were read can fall outside → first / last bucket.
+    position = cast(func.floor((column - low) / width), Integer)
+    bucket = case((position > buckets - 1, buckets - 1), (position < 0, 0), else_=position)
+    rows = await db.execute(
+        select(bucket.label("bucket"), func.count())
+        .where(column.is_not(None))
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+
+    return [
+        {"from": as_number(low + b * width), "to": as_number(low + (b + 1) * width), "count": count}
+        for b, count in ((int(b), count) for b, count in rows)
+    ]
+
+
+# fresh=True → read from the primary, not from a replica
+async def load_stats(fresh=False):
+    async with open_read_session(primary=fresh) as db:
+        # price * quantity is done in BIGINT, two INTEGERs multiplied can overflow
+        summary = (await db.execute(
+            select(
+                func.count().label("products"),
+                func.sum(Product.quantity).label("total_quantity"),
+                func.sum(cast(Product.price, BigInteger) * Product.quantity).label("total_value"),
+                func.count().filter(Product.quantity <= 0).label("out_of_stock"),
+                func.min(Product.price).label("min_price"),
+                func.max(Product.price).label("max_price"),
+                func.avg(Product.price).label("avg_price"),
+                func.min(Product.quantity).label("min_quantity"),
+                func.max(Product.quantity).label("max_quantity"),
+                func.avg(Product.quantity).label("avg_quantity"),
+            )
+        )).mappings().one()
+
+        price_histogram = await histogram(db, Product.price, summary["min_price"], summary["max_price"])
+        quantity_histogram = await histogram(db, Product.quantity, summary["min_quantity"], summary["max_quantity"])
+
+    stats = {key: as_number(value) for key, value in summary.items()}
+    stats["price_histogram"] = price_histogram
+    stats["quantity_histogram"] = quantity_histogram
+    return to_json(stats)
+
+
+# ======================================================================
+# GET: Inventory statistics
+# ======================================================================
+# {"products": 1000000, "total_quantity": ..., "total_value": ..., "out_of_stock": ...,
+#  "min_price": ..., "max_price": ..., "avg_price": ..., (same for quantity),
+#  "price_histogram": [{"from": 0, "to": 100, "count": 5321}, ...],
+#  "quantity_histogram": [...]}
+@router.get("/products/stats")
+async def Product_stats(fresh: bool = False):
+    if fresh or STATS_CACHE_TTL <= 0:
+        body = await load_stats(fresh=True)
+    else:
+        body = await cache.get_or_load("products:stats", load_stats, ttl=STATS_CACHE_TTL)
+    return Response(content=body, media_type="application/json")
+
+
+# ======================================================================
+# GET: Products with low stock
+# ======================================================================
+# GET /products/low-stock?threshold=5&limit=100
+# Products with quantity <= threshold, lowest stock first.
+# Paged like GET /products: send "next_cursor" back to get the next page.
+@router.get("/products/low-stock", response_model=ProductPage)
+async def Low_stock(
+    threshold: int = 5,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fresh: bool = False,
+):
+    async def load_page():
+        async with open_read_session(primary=fresh) as db:
+            stmt = select(*product_columns(Product)).where(Product.quantity <= threshold)
+            stmt = keyset_query(stmt, Product.quantity, Product.id, "asc", cursor, limit)
+            rows = (await db.execute(stmt)).all()
+            rows, next_cursor = page_result(rows, Product.quantity, limit)
+
+        return to_json({"items": [product_row_to_dict(row) for row in rows], "next_cursor": next_cursor})
+
+    if fresh or STATS_CACHE_TTL <= 0:
+        body = await load_page()
+    else:
+        key = f"products:low-stock:{threshold}:{limit}:{cursor}"
+        body = await cache.get_or_load(key, load_page, ttl=STATS_CACHE_TTL)
+    return Response(content=body, media_type="application/json")
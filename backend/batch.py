@@ -0,0 +1,235 @@
+#this file has the BULK IMPORT of products (supplier feeds with 50k+ items)
+#instead of one HTTP call + one commit per product, all rows come in one request
+#and are written with a few big INSERT ... ON CONFLICT statements
+
+# How it works
+# ---------------------------------------------------------
+# 1. The body is read as JSON array, CSV or NDJSON (picked from Content-Type).
+# 2. Every row is validated with the models.Product schema.
+#    Bad rows are reported back, the good ones are still imported.
+# 3. Good rows are written in CHUNKS with one upsert statement per chunk:
+#        INSERT INTO "Product" (...) VALUES (...), (...), ...
+#        ON CONFLICT (id) DO UPDATE SET name = excluded.name, ...
+#    → new ids are inserted, existing ids are updated.
+# 4. The quantity changes are written to the stock ledger (see ledger.py):
+#    the old quantities of the chunk are read with one SELECT first.
+# 5. Several chunks share one transaction (one commit = one fsync).
+#    Each chunk runs inside a SAVEPOINT: if a chunk fails, only that chunk is
+#    retried row by row, so the error can be given to the exact row.
+
+import csv
+import io
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+from models import Product as ProductSchema
+import DB_ORM_Model
+import events
+import ledger
+import sync
+
+
+router = APIRouter()
+
+# Rows written by one INSERT statement
+DEFAULT_CHUNK_SIZE = 1000
+# Rows written between two commits
+DEFAULT_TRANSACTION_SIZE = 10000
+
+INTEGER_FIELDS = ["id", "price", "quantity"]
+INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+
+Product = DB_ORM_Model.Product
+
+UPSERT_BUILDERS = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
+
+
+# Read the request body into a list of dicts
+# ---------------------------------------------------------
+# Content-Type decides the format:
+#   application/json      → [{"id": 1, ...}, {...}]
+#   text/csv              → header line + one product per line
+#   application/x-ndjson  → one JSON object per line
+#
+# A file can be uploaded as the raw body, e.g.
+#   curl -X POST --data-binary @feed.csv -H "Content-Type: text/csv" .../products/batch
+def parse_rows(body, content_type):
+    text = body.decode("utf-8-sig")  # utf-8-sig also removes the BOM some spreadsheet tools add
+
+    if "csv" in content_type:
+        return list(csv.DictReader(io.StringIO(text)))
+
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    rows = json.loads(text)
+    if not isinstance(rows, list):
+        raise ValueError("expected a JSON array of products")
+    return rows
+
+
+# Validate every row with the Pydantic schema
+# ---------------------------------------------------------
+# Returns the valid rows as (row_number, dict) and the per-row results list,
+# which already has an entry for every invalid row.
+#
+# If the same id comes twice, the LAST one wins (like applying the feed in
+# order) — one upsert statement cannot touch the same row two times.
+def validate_rows(raw_rows):
+    results = [None] * len(raw_rows)
+    valid = {}
+
+    for i, raw in enumerate(raw_rows):
+        try:
+            product = ProductSchema.model_validate(raw)
+        except ValidationError as e:
+            results[i] = {"row": i, "id": raw.get("id") if isinstance(raw, dict) else None,
+                          "status": "error", "error": validation_message(e)}
+            continue
+
+        # the Integer columns are 32 bit in the database
+        too_big = [f for f in INTEGER_FIELDS if not INT32_MIN <= getattr(product, f) <= INT32_MAX]
+        if too_big:
+            results[i] = {"row": i, "id": product.id, "status": "error",
+                          "error": f"{too_big[0]}: out of range for a 32 bit integer"}
+            continue
+
+        if product.id in valid:
+            earlier = valid[product.id][0]
+            results[earlier] = {"row": earlier, "id": product.id, "status": "skipped",
+                                "error": f"id repeated in row {i}"}
+        valid[product.id] = (i, product.model_dump())
+
+    return list(valid.values()), results
+
+
+def validation_message(error):
+    first = error.errors()[0]
+    field = ".".join(str(part) for part in first["loc"])
+    return f"{field}: {first['msg']}" if field else first["msg"]
+
+
+# Build the INSERT ... ON CONFLICT (id) DO UPDATE statement
+# ---------------------------------------------------------
+# Postgres and SQLite both support it, the syntax object comes from the dialect.
+def upsert_statement(dialect_name):
+    builder = UPSERT_BUILDERS.get(dialect_name)
+    if builder is None:
+        raise HTTPException(status_code=501, detail=f"bulk upsert is not supported on {dialect_name}")
+
+    table = DB_ORM_Model.Product.__table__
+    stmt = builder(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={c.name: stmt.excluded[c.name] for c in table.columns if c.name != "id"},
+    )
+
+
+# Write one chunk (inside the caller's savepoint)
+# ---------------------------------------------------------
+# New products get an "opening" movement, existing products an "adjustment"
+# movement with the difference between the old and the new quantity.
+async def write_chunk(db, stmt, chunk):
+    ids = [values["id"] for _, values in chunk]
+    old = dict((await db.execute(
+        select(Product.id, Product.quantity).where(Product.id.in_(ids)).with_for_update()
+    )).all())
+
+    # row version for the delta sync (see sync.py), the same for the whole chunk
+    await db.execute(stmt.values(**sync.stamp(db)), [values for _, values in chunk])
+
+    await ledger.record_movements(db, [
+        {"product_id": values["id"],
+         "kind": "adjustment" if values["id"] in old else "opening",
+         "delta": values["quantity"] - (old.get(values["id"]) or 0)}
+        for _, values in chunk
+    ])
+
+
+# Write the validated rows
+# ---------------------------------------------------------
+# rows → list of (row_number, product dict)
+# Fills `results` with "ok" / "error" for every row and returns how many were written.
+async def upsert_products(db, rows, results, chunk_size=DEFAULT_CHUNK_SIZE,
+                          transaction_size=DEFAULT_TRANSACTION_SIZE):
+    stmt = upsert_statement(db.get_bind().dialect.name)
+    written = 0
+    since_commit = 0
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+
+        try:
+            async with db.begin_nested():  # SAVEPOINT for this chunk
+                await write_chunk(db, stmt, chunk)
+            done = chunk
+        except DBAPIError:
+            # Something in the chunk was refused by the database → find which row
+            done = []
+            for i, values in chunk:
+                try:
+                    async with db.begin_nested():
+                        await write_chunk(db, stmt, [(i, values)])
+                    done.append((i, values))
+                except DBAPIError as e:
+                    results[i] = {"row": i, "id": values["id"], "status": "error",
+                                  "error": str(e.orig)}
+
+        for i, values in done:
+            results[i] = {"row": i, "id": values["id"], "status": "ok"}
+        written += len(done)
+
+        since_commit += len(chunk)
+        if since_commit >= transaction_size:
+            await db.commit()
+            since_commit = 0
+
+    await db.commit()
+    return written
+
+
+# ======================================================================
+# POST: Insert or update many products in one request
+# ======================================================================
+# Query parameters:
+#   chunk_size       → rows per INSERT statement
+#   transaction_size → rows per commit
+#
+# Response:
+#   {"received": 50000, "written": 49998, "failed": 2,
+#    "results": [{"row": 0, "id": 1, "status": "ok"}, ...]}
+@router.post("/products/batch")
+async def Batch_products(
+    request: Request,
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=10000),
+    transaction_size: int = Query(DEFAULT_TRANSACTION_SIZE, ge=1),
+    db: AsyncSession = Depends(get_db),
+):
+    content_type = request.headers.get("content-type", "application/json")
+
+    try:
+        raw_rows = parse_rows(await request.body(), content_type)
+    except ValueError as e:  # bad JSON / bad encoding is also a ValueError
+        raise HTTPException(status_code=400, detail=f"could not read the body: {e}")
+
+    rows, results = validate_rows(raw_rows)
+    written = await upsert_products(db, rows, results, chunk_size, transaction_size)
+    await events.products_changed(rows=[values for i, values in rows if results[i]["status"] == "ok"])
+
+    return {
+        "received": len(raw_rows),
+        "written": written,
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "results": results,
+    }
@@ -0,0 +1,104 @@
+#benchmark: how long it takes to turn N products into a JSON response body
+#compares the old path (ORM objects + jsonable_encoder + json) with the
+#fast path used by the list routes (Core select + orjson, see serialization.py)
+#
+# Usage (from the backend folder):
+#   DATABASE_URL=sqlite:///bench.db python benchmarks/bench_serialization.py --rows 10000 100000
+#
+# WARNING: the Product table of DATABASE_URL is emptied before and after the run,
+# so point it at a database used only for benchmarks.
+#
+# Only the query + serialization is timed (no HTTP), so the numbers show
+# what one big list response costs inside the app.
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, insert, select
+
+import DB_ORM_Model
+import database
+import main
+from serialization import orjson, product_columns, product_row_to_dict, to_json
+
+
+Product = DB_ORM_Model.Product
+
+
+async def fill_table(count):
+    async with database.session() as db:
+        await db.execute(delete(Product))
+        rows = [
+            {"id": i, "name": f"item {i}", "description": f"benchmark row {i}",
+             "price": i % 1000, "quantity": i % 50}
+            for i in range(1, count + 1)
+        ]
+        for start in range(0, count, 10000):
+            await db.execute(insert(Product), rows[start:start + 10000])
+        await db.commit()
+
+
+async def empty_table():
+    async with database.session() as db:
+        await db.execute(delete(Product))
+        await db.commit()
+
+
+# Before: ORM objects, FastAPI's jsonable_encoder, standard json module
+async def orm_path(count):
+    async with database.session() as db:
+        products = (await db.execute(select(Product).order_by(Product.id).limit(count))).scalars().all()
+        return json.dumps(jsonable_encoder(products)).encode()
+
+
+# After: plain column tuples, dicts, orjson
+async def core_path(count):
+    async with database.session() as db:
+        rows = (await db.execute(
+            select(*product_columns(Product)).order_by(Product.id).limit(count)
+        )).all()
+        return to_json([product_row_to_dict(row) for row in rows])
+
+
+async def best_of(path, count, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = await path(count)
+        times.append(time.perf_counter() - started)
+    return min(times), len(body)
+
+
+async def run(args):
+    await main.init_db()
+    await fill_table(max(args.rows))
+
+    results = {"database": database.get_engine().dialect.name,
+               "encoder": "orjson" if orjson is not None else "json", "runs": []}
+    for count in args.rows:
+        before, before_bytes = await best_of(orm_path, count, args.repeat)
+        after, after_bytes = await best_of(core_path, count, args.repeat)
+        results["runs"].append({
+            "rows": count,
+            "orm_jsonable_encoder_ms": round(before * 1000, 1),
+            "core_orjson_ms": round(after * 1000, 1),
+            "speedup": round(before / after, 2),
+            "body_bytes": {"before": before_bytes, "after": after_bytes},
+        })
+
+    await empty_table()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ORM + jsonable_encoder vs Core + orjson")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, the best one is kept")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,291 @@
+#load test: many concurrent clients drive the CRUD routes of the API
+#prints throughput, p50/p95/p99 latency and DB queries per request as JSON
+#
+# Usage (from the backend folder):
+#   # app in this process
+#   DATABASE_URL=sqlite:///bench.db python benchmarks/load_test.py --products 10000 --concurrency 50
+#
+#   # a running server
+#   python benchmarks/load_test.py --url http://localhost:8000 --products 0 --concurrency 500
+#
+#   # save the result and compare the next version against it
+#   python benchmarks/load_test.py --output before.json
+#   python benchmarks/load_test.py --baseline before.json --tolerance 0.2
+#   → exits with status 1 if a route got slower / less throughput than allowed
+#
+# --products N seeds N products first (see seed.py, the tables are EMPTIED).
+# With --products 0 the current data is used, and the ids 1..--id-range are hit.
+#
+# Traffic mix (weights, change with --mix list=30,get=40,...):
+#   list   → GET /products?limit=50 (random sort, sometimes a q= filter)
+#   get    → GET /products/{id}
+#   create → POST /products (new ids above the highest id in the table)
+#   put    → PUT /products/{id}
+#   patch  → PATCH /products/{id}
+#   delete → DELETE /products/{id} (only products created by this run)
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+
+DEFAULT_MIX = {"list": 30, "get": 40, "create": 10, "put": 5, "patch": 10, "delete": 5}
+
+# Metrics compared against --baseline (higher_is_better)
+COMPARED = {"rps": True, "p95_ms": False, "p99_ms": False}
+
+
+# SQL queries per request
+# ---------------------------------------------------------
+# The app sends them in the Server-Timing header (see metrics.py):
+#   Server-Timing: db;dur=3.1;desc="2 queries", app;dur=4.7
+# It also counts the queries of a shared batch (singleflight.BatchLoader) for
+# every request that waited for it, which a counter here could not see.
+# A response without the header (older server, 503 from admission control)
+# is left out of queries_per_request.
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def queries_of(response):
+    match = SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+    return int(match.group(1)) if match else None
+
+
+def ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+# Results of one route
+class RouteStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.queries = 0
+        self.counted = 0    # responses that said how many queries they sent
+
+    def summary(self, elapsed):
+        values = sorted(self.latencies)
+        count = len(values)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "rps": round(count / elapsed, 1) if elapsed else 0.0,
+            "mean_ms": ms(sum(values) / count) if count else None,
+            "p50_ms": ms(percentile(values, 50)),
+            "p95_ms": ms(percentile(values, 95)),
+            "p99_ms": ms(percentile(values, 99)),
+            "max_ms": ms(values[-1]) if count else None,
+            "queries_per_request": round(self.queries / self.counted, 2) if self.counted else None,
+        }
+
+
+# Requests of the traffic mix
+# ---------------------------------------------------------
+# Every function returns the HTTP response.
+# new_ids is shared by all clients, so two clients never create the same id.
+class Scenario:
+    def __init__(self, client, id_range, new_ids, seed):
+        self.client = client
+        self.id_range = id_range
+        self.new_ids = new_ids
+        self.rnd = random.Random(seed)
+        self.created = []
+
+    def product(self, id):
+        return {"id": id, "name": f"load {id}", "description": "load test",
+                "price": self.rnd.randint(1, 5000), "quantity": self.rnd.randint(0, 500)}
+
+    def existing_id(self):
+        return self.rnd.randint(1, self.id_range)
+
+    async def list(self):
+        params = {"limit": 50, "sort": self.rnd.choice(["id", "name", "price", "quantity"]),
+                  "order": self.rnd.choice(["asc", "desc"])}
+        if self.rnd.random() < 0.2:
+            params["q"] = self.rnd.choice(["mouse", "dell", "cable", "apple"])
+        return await self.client.get("/products", params=params)
+
+    async def get(self):
+        return await self.client.get(f"/products/{self.existing_id()}")
+
+    async def create(self):
+        id = next(self.new_ids)
+        res = await self.client.post("/products", json=self.product(id))
+        if res.status_code == 200:
+            self.created.append(id)
+        return res
+
+    async def put(self):
+        id = self.existing_id()
+        return await self.client.put(f"/products/{id}", json=self.product(id))
+
+    async def patch(self):
+        return await self.client.patch(f"/products/{self.existing_id()}",
+                                       json={"price": self.rnd.randint(1, 5000)})
+
+    async def delete(self):
+        if not self.created:  # nothing of ours to delete yet
+            return await self.get()
+        id = self.created.pop(self.rnd.randrange(len(self.created)))
+        return await self.client.delete(f"/products/{id}")
+
+
+# One client: send requests one after another until the time is up
+async def worker(scenario, routes, weights, stats, deadline):
+    while time.perf_counter() < deadline:
+        route = scenario.rnd.choices(routes, weights)[0]
+
+        started = time.perf_counter()
+        queries = None
+        try:
+            res = await getattr(scenario, route)()
+            failed = res.status_code >= 500
+            queries = queries_of(res)
+        except httpx.HTTPError:
+            failed = True
+        elapsed = time.perf_counter() - started
+
+        stats[route].latencies.append(elapsed)
+        stats[route].errors += failed
+        if queries is not None:
+            stats[route].queries += queries
+            stats[route].counted += 1
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        route, _, weight = part.partition("=")
+        if route.strip() not in DEFAULT_MIX:
+            raise SystemExit(f"unknown route in --mix: {route}")
+        mix[route.strip()] = float(weight)
+    return mix
+
+
+# First id that is free for the "create" requests
+async def next_free_id(client):
+    res = await client.get("/products", params={"sort": "id", "order": "desc", "limit": 1})
+    items = res.json()["items"]
+    return items[0]["id"] + 1 if items else 1
+
+
+# Compare with a previous result, return the list of regressions
+def compare(result, baseline, tolerance):
+    regressions = []
+    old_routes = {"total": baseline.get("total"), **baseline.get("routes", {})}
+    for route, now in {"total": result["total"], **result["routes"]}.items():
+        before = old_routes.get(route)
+        if not before:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = before.get(metric), now.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append({"route": route, "metric": metric, "before": old,
+                                    "after": new, "change": round(change, 3)})
+    return regressions
+
+
+async def run(args):
+    in_process = args.url is None
+    if in_process:
+        import database
+        import main
+
+        from seed import create_tables
+
+        await create_tables()
+        # app errors become 500 responses, like behind a real server
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        base_url, target = "http://bench", database.get_engine().dialect.name
+    else:
+        transport, base_url, target = None, args.url, args.url
+
+    if args.products:
+        from seed import seed
+        await seed(args.products)
+    id_range = args.products or args.id_range
+
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    routes, weights = list(mix), list(mix.values())
+    stats = {route: RouteStats() for route in routes}
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits,
+                                 timeout=args.timeout) as client:
+        # warm up the pool and the caches before measuring
+        await asyncio.gather(*[client.get("/products") for _ in range(min(args.concurrency, 10))])
+        new_ids = itertools.count(await next_free_id(client))
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*[
+            worker(Scenario(client, id_range, new_ids, args.seed + i), routes, weights, stats, deadline)
+            for i in range(args.concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    total = RouteStats()
+    for route_stats in stats.values():
+        total.latencies += route_stats.latencies
+        total.errors += route_stats.errors
+        total.queries += route_stats.queries
+        total.counted += route_stats.counted
+
+    result = {
+        "target": target,
+        "products": id_range,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 3),
+        "mix": mix,
+        "total": total.summary(elapsed),
+        "routes": {route: s.summary(elapsed) for route, s in stats.items()},
+    }
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["regressions"] = compare(result, json.load(f), args.tolerance)
+        status = 1 if result["regressions"] else 0
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="concurrent load test of the product CRUD routes")
+    parser.add_argument("--url", help="base URL of a running server (default: run the app in this process)")
+    parser.add_argument("--products", type=int, default=10000, help="products to seed first (0 = keep the data)")
+    parser.add_argument("--id-range", type=int, default=1000, help="ids 1..N are used when --products is 0")
+    parser.add_argument("--concurrency", type=int, default=50, help="clients sending requests at the same time")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--mix", help="route weights, e.g. list=30,get=40,create=10,put=5,patch=10,delete=5")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds before a request is counted as failed")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the clients")
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed change before it is a regression (0.2 = 20%%)")
+    sys.exit(asyncio.run(run(parser.parse_args())))
@@ -0,0 +1,164 @@
+#this file has the BULK UPDATE of products (mass repricing, stock resets)
+#instead of one PUT per product, the client sends a filter + an operation,
+#and the database changes all matching rows with a few set-based UPDATEs
+
+# How it works
+# ---------------------------------------------------------
+# POST /products/bulk-update
+#   {"filter": {"name_contains": "mouse", "price_max": 500},
+#    "operation": {"field": "price", "op": "multiply", "value": 1.1}}
+#
+# The matching products are walked in id order, chunk_size at a time.
+# Every chunk is its own short transaction:
+#   1. find the id range of the next chunk:
+#        SELECT max(id) FROM (SELECT id FROM "Product" WHERE <filter> AND id > :last
+#                             ORDER BY id LIMIT :chunk_size)
+#      (no "id > :last" for the first chunk: a "below every id" number
+#      would not fit the 32 bit parameter Postgres gets for it)
+#   2. (quantity only) write the ledger lines in the database:
+#        INSERT INTO "StockMovement" (...) SELECT id, 'adjustment', :value - quantity, ...
+#        FROM "Product" WHERE <filter> AND id > :last AND id <= :upper FOR UPDATE
+#   3. UPDATE "Product" SET price = round(price * 1.1), version = ...
+#        WHERE <filter> AND id > :last AND id <= :upper RETURNING id
+#   4. COMMIT, clear the cache for those ids, publish a "resync" event
+# No row ever travels to Python and back, and no transaction (or lock) lasts
+# longer than one chunk, so the app keeps serving other requests meanwhile.
+#
+# If a chunk fails (e.g. a price goes beyond the 32 bit column), the chunks
+# before it stay saved. The error says how many products were updated and
+# the id to go on from (filter.id_min).
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import Integer, cast, func, insert, literal, select, update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+from models import BulkUpdate
+from pagination import like_pattern
+import DB_ORM_Model
+import events
+import sync
+
+
+router = APIRouter()
+
+# Products changed by one UPDATE / one transaction
+DEFAULT_CHUNK_SIZE = 5000
+
+Product = DB_ORM_Model.Product
+StockMovement = DB_ORM_Model.StockMovement
+
+
+# The filter as a list of WHERE conditions
+def filter_conditions(f):
+    conditions = []
+    if f.ids is not None:
+        conditions.append(Product.id.in_(f.ids))
+    if f.id_min is not None:
+        conditions.append(Product.id >= f.id_min)
+    if f.id_max is not None:
+        conditions.append(Product.id <= f.id_max)
+    if f.name_contains:
+        conditions.append(Product.name.ilike(like_pattern(f.name_contains), escape="\\"))
+    for column, low, high in ((Product.price, f.price_min, f.price_max),
+                              (Product.quantity, f.quantity_min, f.quantity_max)):
+        if low is not None:
+            conditions.append(column >= low)
+        if high is not None:
+            conditions.append(column <= high)
+    return conditions
+
+
+# The new value of the column, as an SQL expression on the old one
+def new_value(operation):
+    column = getattr(Product, operation.field)
+    if operation.op == "set":
+        return int(operation.value)
+    if operation.op == "add":
+        return column + int(operation.value)
+    return cast(func.round(column * operation.value), Integer)  # price stays a whole number
+
+
+# Update the next chunk after `after_id` (inside the caller's transaction)
+# ---------------------------------------------------------
+# after_id None → the first chunk.
+# Returns (upper id of the chunk, ids that were changed), or (None, []) when done.
+async def update_chunk(db, conditions, body, after_id, chunk_size):
+    stamp = sync.stamp(db)  # row version for the delta sync (see sync.py)
+    if after_id is not None:
+        conditions = [*conditions, Product.id > after_id]
+
+    chunk = (
+        select(Product.id)
+        .where(*conditions)
+        .order_by(Product.id)
+        .limit(chunk_size)
+        .subquery()
+    )
+    upper = await db.scalar(select(func.max(chunk.c.id)))
+    if upper is None:
+        return None, []
+
+    in_chunk = [*conditions, Product.id <= upper]
+    operation = body.operation
+
+    if operation.field == "quantity":
+        target = int(operation.value)
+        await db.execute(
+            insert(StockMovement).from_select(
+                ["product_id", "kind", "delta", "created_at", "reference"],
+                select(
+                    Product.id, literal("adjustment"), target - func.coalesce(Product.quantity, 0),
+                    literal(stamp["updated_at"]), literal(body.reference),
+                )
+                .where(*in_chunk, func.coalesce(Product.quantity, 0) != target)
+                .with_for_update(),
+            )
+        )
+
+    ids = (await db.execute(
+        update(Product)
+        .where(*in_chunk)
+        .values({operation.field: new_value(operation), **stamp})
+        .returning(Product.id)
+    )).scalars().all()
+    return upper, ids
+
+
+# ======================================================================
+# POST: Change many products with one filter + one operation
+# ======================================================================
+# Response:
+#   {"updated": 100000, "chunks": 20}
+@router.post("/products/bulk-update")
+async def Bulk_update(
+    body: BulkUpdate,
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=50000),
+    db: AsyncSession = Depends(get_db),
+):
+    conditions = filter_conditions(body.filter)
+    updated = 0
+    chunks = 0
+    after_id = None
+
+    while True:
+        try:
+            upper, ids = await update_chunk(db, conditions, body, after_id, chunk_size)
+            await db.commit()
+        except DBAPIError as e:
+            await db.rollback()
+            raise HTTPException(status_code=422, detail={
+                "error": str(e.orig),
+                "updated": updated,
+                "resume_from_id": after_id + 1 if after_id is not None else body.filter.id_min,
+            })
+
+        if upper is None:
+            break
+        chunks += 1
+        updated += len(ids)
+        after_id = upper
+        await events.products_changed(changed_ids=ids)  # after the commit of this chunk
+
+    return {"updated": updated, "chunks": chunks}
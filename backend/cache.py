@@ -0,0 +1,318 @@
+#this file has the CACHE that sits in front of the product reads
+#a cached answer is already JSON bytes, so a hit needs no database query and no serialization
+
+# How it works
+# ---------------------------------------------------------
+# Keys:
+#   product:<id>                      → JSON of one product
+#   products:list:<version>:<params>  → JSON of one page of GET /products
+#   products:version                  → "clock" that moves on EVERY product write
+#
+# Invalidation:
+#   - a write deletes product:<id> of the rows it touched (exact invalidation)
+#   - and moves products:version forward, so every cached page gets a new key.
+#     Old pages are never read again and fall out by LRU / TTL.
+#   - both happen in ONE step (a Lua script on Redis), and a loaded answer is
+#     only stored if the version is still the one it was loaded for (checked
+#     in the same step as the SET), so a load racing a write never caches
+#     the old row.
+#
+# The version is a timestamp in microseconds, so it is also used for the
+# Last-Modified header, and it is part of the ETag of every list page.
+#
+# Backends:
+#   CACHE_URL=memory://             → LRU + TTL dict inside this process (default)
+#   CACHE_URL=redis://localhost:6379/0 → Redis (or any Redis-compatible server),
+#                                       shared by all workers (pip install redis)
+#
+# With several workers use Redis: with memory:// every worker has its own
+# cache and does not see the writes handled by the other workers.
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Response
+
+from singleflight import SingleFlight
+
+
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))              # seconds an entry stays valid
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))  # memory backend only
+
+VERSION_KEY = "products:version"
+
+
+def now_us():
+    return int(time.time() * 1_000_000)
+
+
+# In-process backend: LRU + TTL
+# ---------------------------------------------------------
+# OrderedDict keeps the keys in "last used" order: a hit moves the key to the
+# end, and when the cache is full the first (least recently used) key is dropped.
+class MemoryCache:
+    name = "memory"
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()   # key → (expires_at, value)
+        self._clocks = {}            # version keys, never evicted
+        self._lock = threading.Lock()
+
+    async def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    # only_at=(clock key, value) → store only while the clock still shows that value
+    async def set(self, key, value, ttl=None, only_at=None):
+        with self._lock:
+            if only_at is not None and self._clocks.get(only_at[0]) != only_at[1]:
+                return
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    async def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    # A clock starts at "now" and only moves forward
+    async def clock(self, key):
+        with self._lock:
+            return self._clocks.setdefault(key, now_us())
+
+    # Move the clock forward and drop the `delete` keys, in one step
+    async def tick(self, key, *delete):
+        with self._lock:
+            value = max(self._clocks.get(key, 0) + 1, now_us())
+            self._clocks[key] = value
+            for stale in delete:
+                self._data.pop(stale, None)
+            return value
+
+    def size(self):
+        return len(self._data)
+
+
+# Redis backend
+# ---------------------------------------------------------
+# Same methods as MemoryCache, so the rest of the code does not care which one is used.
+
+# KEYS[1] = clock key, KEYS[2...] = keys to delete, ARGV[1] = now (µs);
+# a Lua number holds µs exactly (< 2^53)
+TICK_SCRIPT = """
+local value = math.max((tonumber(redis.call('GET', KEYS[1])) or 0) + 1, tonumber(ARGV[1]))
+redis.call('SET', KEYS[1], string.format('%d', value))
+for i = 2, #KEYS do
+    redis.call('DEL', KEYS[i])
+end
+return value
+"""
+
+# KEYS[1] = key, KEYS[2] = clock key, ARGV = value, ttl (ms), expected clock
+SET_AT_SCRIPT = """
+if redis.call('GET', KEYS[2]) == ARGV[3] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+end
+"""
+
+
+class RedisCache:
+    name = "redis"
+
+    def __init__(self, url, ttl=CACHE_TTL):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL points to Redis but the 'redis' package is not installed")
+
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self._tick = self.client.register_script(TICK_SCRIPT)
+        self._set_at = self.client.register_script(SET_AT_SCRIPT)
+
+    async def get(self, key):
+        return await self.client.get(key)
+
+    async def set(self, key, value, ttl=None, only_at=None):
+        px = int((ttl or self.ttl) * 1000)
+        if only_at is None:
+            await self.client.set(key, value, px=px)
+        else:
+            await self._set_at(keys=[key, only_at[0]], args=[value, px, only_at[1]])
+
+    async def delete(self, *keys):
+        if keys:
+            await self.client.delete(*keys)
+
+    async def clock(self, key):
+        await self.client.set(key, now_us(), nx=True)
+        return int(await self.client.get(key))
+
+    # max(previous + 1, now) in ONE step on the server: the hosts' clocks may
+    # differ, and two hosts may tick at the same moment; it never goes back
+    async def tick(self, key, *delete):
+        return int(await self._tick(keys=[key, *delete], args=[now_us()]))
+
+    def size(self):
+        return None
+
+
+def make_cache(url=CACHE_URL):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url)
+    return MemoryCache()
+
+
+cache = make_cache()
+
+
+# Hit / miss counters (for this process)
+# ---------------------------------------------------------
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def snapshot(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": cache.name,
+            "entries": cache.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "coalesced": flights.shared,
+        }
+
+
+stats = CacheStats()
+
+# concurrent misses of the same key share one load (see singleflight.py)
+flights = SingleFlight()
+
+
+# Read through the cache
+# ---------------------------------------------------------
+# load() is only called on a miss. It must return the JSON bytes to cache,
+# or None for "nothing to cache" (e.g. product not found).
+#
+# version → products_version() read BEFORE loading. If a write happened while
+# we were loading, the result may already be old, so it is returned but not cached.
+# Leave it out for keys that are allowed to be a little old (they use a short ttl).
+#
+# Misses of the same key (and version) at the same moment run load() only once,
+# e.g. a hot product right after a write cleared it (see singleflight.py).
+async def get_or_load(key, load, version=None, ttl=None):
+    value = await cache.get(key)
+    if value is not None:
+        stats.hits += 1
+        return value
+
+    stats.misses += 1
+
+    async def load_and_store():
+        value = await load()
+        if value is not None:
+            # with a version: stored only if no write ticked the clock meanwhile
+            # (checked in the same step as the SET, see invalidate_products)
+            await cache.set(key, value, ttl, only_at=None if version is None else (VERSION_KEY, version))
+        return value
+
+    return await flights.do((key, version), load_and_store)
+
+
+def product_key(id):
+    return f"product:{id}"
+
+
+def list_key(version, params):
+    return f"products:list:{version}:{params}"
+
+
+def search_key(version, params):
+    return f"products:search:{version}:{params}"
+
+
+async def products_version():
+    return await cache.clock(VERSION_KEY)
+
+
+# Call this AFTER a write is committed
+# ---------------------------------------------------------
+# ids → the product ids that were inserted / changed / deleted
+# The version moves on and the rows are dropped in ONE step: a load that read
+# the old row can then neither find the old version nor store after the delete.
+async def invalidate_products(ids):
+    await cache.tick(VERSION_KEY, *[product_key(id) for id in ids])
+    stats.invalidations += 1
+
+
+# ETag / Last-Modified
+# ---------------------------------------------------------
+# The browser sends the ETag back in If-None-Match (or the date in
+# If-Modified-Since). If nothing changed we answer 304 with an empty body.
+def etag_for(*parts):
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"|")
+    return f'"{digest.hexdigest()}"'
+
+
+def http_date(version):
+    return formatdate(version / 1_000_000, usegmt=True)
+
+
+def is_not_modified(request, etag, version):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # ETag wins over the date when both are sent
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(version / 1_000_000) <= since  # HTTP dates only have whole seconds
+
+    return False
+
+
+def validator_headers(etag, version):
+    return {
+        "ETag": etag,
+        "Last-Modified": http_date(version),
+        "Cache-Control": "no-cache",  # the browser may keep it, but must ask us (→ 304) before using it
+    }
+
+
+def not_modified_response(etag, version):
+    stats.not_modified += 1
+    return Response(status_code=304, headers=validator_headers(etag, version))
+
+
+def cached_json_response(body, etag, version):
+    return Response(content=body, media_type="application/json", headers=validator_headers(etag, version))
@@ -0,0 +1,149 @@
+#this file has the LIVE CHANGE FEED of products
+#every write publishes an event, and every open dashboard receives it at once (Server-Sent Events)
+
+# How it works
+# ---------------------------------------------------------
+# 1. After a write is committed, the route calls products_changed(...).
+#    That clears the cache entries (cache.py) and publishes ONE event:
+#        {"type": "upsert", "items": [{...product...}, ...]}
+#        {"type": "delete", "ids": [3, 4]}
+#        {"type": "resync"}            ← too many rows changed, reload the list
+# 2. The Broadcaster keeps one small queue per connected client and puts the
+#    event in every queue (the event is encoded only once).
+# 3. GET /products/stream sends the queue to the browser as text/event-stream.
+#    The browser's EventSource reconnects by itself if the connection drops.
+#
+# Backpressure: a client that does not read fast enough fills its queue.
+# Then its backlog is thrown away and it gets a single "resync" event instead,
+# so a slow client never blocks the writers or makes memory grow.
+#
+# The broadcaster lives in this process. With several workers, each worker
+# only sends the writes it handled itself.
+
+import asyncio
+import os
+
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+
+from serialization import to_json
+import cache
+
+
+router = APIRouter()
+
+# Events a client may have waiting before it is considered too slow
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+# Bigger writes are announced as "resync" instead of sending every row
+MAX_EVENT_ITEMS = int(os.getenv("STREAM_MAX_EVENT_ITEMS", "500"))
+# Seconds between keep-alive comments (stops proxies from closing idle streams)
+HEARTBEAT_SECONDS = 15
+
+
+def sse_message(event_id, data):
+    return b"id: %d\ndata: %s\n\n" % (event_id, to_json(data))
+
+
+RESYNC = {"type": "resync"}
+
+
+class Broadcaster:
+    def __init__(self, queue_size=STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.last_id = 0
+        self.published = 0
+        self.dropped = 0   # clients that were too slow and got a resync
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, data):
+        self.last_id += 1
+        self.published += 1
+        message = sse_message(self.last_id, data)
+
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # too slow: forget the backlog, tell the client to reload instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(sse_message(self.last_id, RESYNC))
+                self.dropped += 1
+
+    def snapshot(self):
+        return {
+            "clients": len(self.subscribers),
+            "published": self.published,
+            "slow_client_resyncs": self.dropped,
+        }
+
+
+broadcaster = Broadcaster()
+
+
+# Call this AFTER a write is committed
+# ---------------------------------------------------------
+# rows        → dicts of the products that were inserted / changed (full rows)
+# deleted_ids → ids of the products that were deleted
+# changed_ids → ids that changed when the new rows are not at hand (sends "resync")
+async def products_changed(rows=(), deleted_ids=(), changed_ids=()):
+    rows, deleted_ids, changed_ids = list(rows), list(deleted_ids), list(changed_ids)
+
+    ids = [row["id"] for row in rows] + deleted_ids + changed_ids
+    if not ids:
+        return
+    await cache.invalidate_products(ids)
+
+    if changed_ids or len(rows) > MAX_EVENT_ITEMS or len(deleted_ids) > MAX_EVENT_ITEMS:
+        broadcaster.publish(RESYNC)
+        return
+    if rows:
+        broadcaster.publish({"type": "upsert", "items": rows})
+    if deleted_ids:
+        broadcaster.publish({"type": "delete", "ids": deleted_ids})
+
+
+# ======================================================================
+# GET: Live stream of product changes (Server-Sent Events)
+# ======================================================================
+# In the browser:
+#   const source = new EventSource("http://localhost:8000/products/stream");
+#   source.onmessage = (e) => { const event = JSON.parse(e.data); ... };
+@router.get("/products/stream")
+async def Product_stream(request: Request):
+    queue = broadcaster.subscribe()
+
+    async def messages():
+        try:
+            yield b": connected\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": ping\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # tell nginx not to buffer the stream
+    }
+    return StreamingResponse(messages(), media_type="text/event-stream", headers=headers)
+
+
+# ======================================================================
+# GET: Stream statistics
+# ======================================================================
+@router.get("/products/stream/stats")
+async def Stream_stats():
+    return broadcaster.snapshot()
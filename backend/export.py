@@ -0,0 +1,113 @@
+#this file has the bulk EXPORT of the Product table (for the nightly reconciliation)
+#the rows are streamed to the client in chunks, the whole table is never loaded in memory
+
+# How it works
+# ---------------------------------------------------------
+# 1. db.stream() runs the SELECT with a server-side cursor, so the database
+#    sends the rows little by little instead of all at once.
+# 2. Every chunk of rows is turned into CSV / NDJSON text by a generator.
+# 3. StreamingResponse sends each piece of text to the client as soon as it
+#    is ready. Memory stays the same for 10k or 10M rows.
+#
+# With ?gzip=true the text is compressed on the fly (Content-Encoding: gzip).
+
+import csv
+import io
+import zlib
+from typing import Literal
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from replicas import open_read_session
+from serialization import to_json
+import DB_ORM_Model
+
+
+router = APIRouter()
+
+# How many rows are fetched from the cursor and written in one go
+EXPORT_CHUNK_SIZE = 5000
+
+COLUMNS = ["id", "name", "description", "price", "quantity"]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+# Read the table chunk by chunk
+# ---------------------------------------------------------
+# The generator opens its OWN session (not get_db), because the response is
+# still being sent after the route function has returned.
+# The export only reads, so it runs on a read replica when there is one.
+# Plain column tuples are selected, so no ORM objects are built for each row.
+async def stream_rows(chunk_size=EXPORT_CHUNK_SIZE):
+    table = DB_ORM_Model.Product.__table__
+    stmt = (
+        select(*[table.c[name] for name in COLUMNS])
+        .order_by(table.c.id)
+        .execution_options(yield_per=chunk_size)
+    )
+
+    async with open_read_session() as db:
+        result = await db.stream(stmt)
+        async for rows in result.partitions(chunk_size):
+            yield rows
+
+
+# Turn chunks of rows into text
+# ---------------------------------------------------------
+async def csv_chunks(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(COLUMNS)
+    async for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():  # only the header, when the table is empty
+        yield buffer.getvalue().encode()
+
+
+async def ndjson_chunks(chunks):
+    async for rows in chunks:
+        yield b"".join(to_json(dict(zip(COLUMNS, row))) + b"\n" for row in rows)
+
+
+# Compress the stream with gzip, piece by piece
+async def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # wbits=31 → gzip header + trailer
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# ======================================================================
+# GET: Export every product as CSV or NDJSON
+# ======================================================================
+# Examples:
+#   GET /products/export?format=csv
+#   GET /products/export?format=ndjson&gzip=true
+@router.get("/products/export")
+async def Export_products(format: Literal["csv", "ndjson"] = "csv", gzip: bool = False):
+    rows = stream_rows()
+
+    if format == "csv":
+        body = csv_chunks(rows)
+    else:
+        body = ndjson_chunks(rows)
+
+    headers = {"Content-Disposition": f'attachment; filename="products.{format}"'}
+    if gzip:
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format], headers=headers)
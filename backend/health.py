@@ -0,0 +1,118 @@
+#this file has the STARTUP steps and the health probes of the app
+#a worker starts at once, prepares the database in the background,
+#and only says "ready" once the connection pool is warm
+
+# How it works
+# ---------------------------------------------------------
+# The lifespan in main.py starts prepare() as a background task:
+#   1. run the startup steps (create tables / sample data, both optional)
+#   2. open DB_POOL_WARMUP connections, so the first requests do not pay
+#      for the TCP + TLS + auth handshake
+#   3. mark the app as ready
+# If the database cannot be reached, the steps are retried with a growing
+# delay (up to 10 s). The worker keeps running in the meantime, it just is
+# not ready.
+#
+# Probes (for Kubernetes, a load balancer, docker-compose healthcheck ...):
+#   GET /healthz → 200 while the process and the event loop are alive (liveness)
+#   GET /readyz  → 200 once prepare() is done AND the database answers,
+#                  503 otherwise, so no traffic is sent to a cold worker (readiness)
+
+import asyncio
+import logging
+import os
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from database import POOL_SIZE, get_engine
+
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Connections opened before the worker reports ready
+POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", str(POOL_SIZE)))
+# Seconds the readiness probe waits for "SELECT 1"
+READY_CHECK_TIMEOUT = float(os.getenv("READY_CHECK_TIMEOUT", "2"))
+
+RETRY_MIN_DELAY = 0.5
+RETRY_MAX_DELAY = 10.0
+
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.attempts = 0
+        self.last_error = None
+
+
+readiness = Readiness()
+
+
+# Open `count` pool connections at the same time and give them back
+# ---------------------------------------------------------
+# The pool keeps them open, so they are ready for the first requests.
+async def warm_pool(count=POOL_WARMUP):
+    engine = get_engine()
+
+    async def touch():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*[touch() for _ in range(max(count, 1))])
+
+
+# Run the startup steps until they work, then mark the app ready
+# ---------------------------------------------------------
+# steps → async function with the (idempotent) startup work, e.g. main.init_db
+async def prepare(steps):
+    delay = RETRY_MIN_DELAY
+    while True:
+        readiness.attempts += 1
+        try:
+            await steps()
+            await warm_pool()
+        except Exception as e:  # DB down, DNS, auth ... → try again later
+            readiness.last_error = f"{type(e).__name__}: {e}"
+            logger.warning("database not ready (attempt %d): %s", readiness.attempts, readiness.last_error)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+            continue
+
+        readiness.ready = True
+        readiness.last_error = None
+        logger.info("database ready after %d attempt(s)", readiness.attempts)
+        return
+
+
+# ======================================================================
+# GET: Liveness probe
+# ======================================================================
+# Does not touch the database: a slow database must not get the worker restarted.
+@router.get("/healthz")
+async def Healthz():
+    return {"status": "ok"}
+
+
+# ======================================================================
+# GET: Readiness probe
+# ======================================================================
+@router.get("/readyz")
+async def Readyz():
+    if not readiness.ready:
+        return JSONResponse(status_code=503, content={
+            "status": "starting", "attempts": readiness.attempts, "error": readiness.last_error,
+        })
+
+    async def ping():
+        async with get_engine().connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    try:
+        await asyncio.wait_for(ping(), READY_CHECK_TIMEOUT)  # also covers waiting for a pool connection
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "database unavailable", "error": str(e)})
+
+    return {"status": "ready"}
@@ -0,0 +1,285 @@
+#this file has the STOCK LEDGER: every quantity change is stored as a movement row
+#so we keep the history and can answer "how much stock did we have at time T?"
+
+# How it works
+# ---------------------------------------------------------
+# Writing (apply_movements):
+#   1. ONE UPDATE moves Product.quantity of all touched products by their deltas
+#      (quantity = quantity + CASE id WHEN ... END), like the adjust routes.
+#   2. ONE multi-row INSERT appends the movement rows to StockMovement.
+#   Both in the same transaction → the current quantity and the ledger always agree.
+#   The current quantity is kept up to date step by step, it is never recomputed.
+#
+# Snapshots (checkpoint):
+#   From time to time the current quantity of every product that moved since the
+#   last checkpoint is copied to StockSnapshot, with the id of the last movement
+#   it includes.
+#
+# Reading (stock_at):
+#   stock at T = latest snapshot taken before T
+#              + SUM(delta) of the movements after that snapshot, up to T
+#   → only a short tail of the ledger is read, never the whole history.
+#
+# Products that existed before the ledger: run one checkpoint
+# (POST /movements/checkpoint) so they get a starting snapshot.
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import case, func, insert, literal, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db, session
+from replicas import get_read_db
+from models import MovementBatch
+from serialization import product_columns
+import DB_ORM_Model
+import sync
+import events
+
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+Product = DB_ORM_Model.Product
+StockMovement = DB_ORM_Model.StockMovement
+StockSnapshot = DB_ORM_Model.StockSnapshot
+
+# Seconds between automatic checkpoints (0 = off)
+CHECKPOINT_INTERVAL = float(os.getenv("LEDGER_CHECKPOINT_INTERVAL", "0"))
+
+
+# All ledger times are naive UTC, so they compare the same way in Postgres and SQLite
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def as_utc(moment):
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+# Append movements WITHOUT touching Product.quantity
+# ---------------------------------------------------------
+# For changes where the new quantity is already written by the caller
+# (new product, PUT with a new quantity, bulk import, delete).
+# movements → list of dicts: product_id, kind, delta, (reference)
+async def record_movements(db, movements, at=None):
+    rows = [
+        {"product_id": m["product_id"], "kind": m["kind"], "delta": m["delta"],
+         "reference": m.get("reference"), "created_at": at or utcnow()}
+        for m in movements
+        if m["delta"] != 0
+    ]
+    if rows:
+        await db.execute(insert(StockMovement), rows)
+
+
+# Apply movements: move Product.quantity AND append to the ledger
+# ---------------------------------------------------------
+# movements   → list of dicts: product_id, kind, delta, (reference)
+# no_negative → products whose stock would go below 0 are left unchanged
+#
+# Returns {product_id: product row (dict)} for the products that were changed,
+# with the new quantity (RETURNING gives back the whole row, no extra SELECT).
+# Movements of missing / refused products are not written.
+# The caller commits.
+async def apply_movements(db, movements, no_negative=False):
+    deltas = {}
+    for m in movements:
+        deltas[m["product_id"]] = deltas.get(m["product_id"], 0) + m["delta"]
+
+    if not deltas:
+        return {}
+
+    stamp = sync.stamp(db)  # row version for the delta sync (see sync.py)
+    delta = case(deltas, value=Product.id)
+    stmt = (
+        update(Product)
+        .where(Product.id.in_(deltas))
+        .values(quantity=Product.quantity + delta, **stamp)
+        .returning(*product_columns(Product))
+    )
+    if no_negative:
+        stmt = stmt.where(Product.quantity + delta >= 0)
+
+    applied = {row["id"]: dict(row) for row in (await db.execute(stmt)).mappings()}
+    await record_movements(db, [m for m in movements if m["product_id"] in applied])
+    return applied
+
+
+# Which of these ids were refused, and why
+# ---------------------------------------------------------
+# Only called on the unhappy path, to tell "not found" from "insufficient stock".
+async def rejection_reasons(db, ids):
+    if not ids:
+        return []
+    existing = set((await db.execute(select(Product.id).where(Product.id.in_(ids)))).scalars())
+    return [
+        {"id": id, "reason": "insufficient stock" if id in existing else "not found"}
+        for id in ids
+    ]
+
+
+# Checkpoint: snapshot the products that moved since the last checkpoint
+# ---------------------------------------------------------
+# The first checkpoint snapshots EVERY product (starting point for old products).
+# One INSERT ... SELECT does the work inside the database.
+#
+# Postgres: the ledger is locked in SHARE mode for the moment of the snapshot,
+# so a movement still being written cannot have an id below last_movement_id
+# without being counted in the quantity. (SQLite writes one transaction at a time.)
+async def checkpoint(db):
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(text('LOCK TABLE "StockMovement" IN SHARE MODE'))
+
+    previous = await db.scalar(select(func.max(StockSnapshot.last_movement_id)))
+    last_movement_id = await db.scalar(select(func.coalesce(func.max(StockMovement.id), 0)))
+    taken_at = utcnow()
+
+    products = select(
+        Product.id, Product.quantity, literal(last_movement_id), literal(taken_at)
+    ).where(Product.quantity.is_not(None))
+
+    if previous is not None:
+        if last_movement_id == previous:
+            return {"snapshots": 0, "last_movement_id": last_movement_id}
+
+        moved = (
+            select(StockMovement.product_id)
+            .where(StockMovement.id > previous, StockMovement.id <= last_movement_id)
+            .distinct()
+        )
+        products = products.where(Product.id.in_(moved))
+
+    result = await db.execute(
+        insert(StockSnapshot).from_select(
+            ["product_id", "quantity", "last_movement_id", "taken_at"], products
+        )
+    )
+    await db.commit()
+    return {"snapshots": result.rowcount, "last_movement_id": last_movement_id}
+
+
+# Run a checkpoint every `interval` seconds (started from main.py if enabled)
+async def checkpoint_loop(interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session() as db:
+                await checkpoint(db)
+        except Exception:
+            logger.exception("stock checkpoint failed")
+
+
+# Stock of one product at a moment in time
+# ---------------------------------------------------------
+async def stock_at(db, product_id, at):
+    snapshot = (
+        await db.execute(
+            select(StockSnapshot.quantity, StockSnapshot.last_movement_id)
+            .where(StockSnapshot.product_id == product_id, StockSnapshot.taken_at <= at)
+            .order_by(StockSnapshot.taken_at.desc())
+            .limit(1)
+        )
+    ).first()
+
+    base_quantity, after_id = (snapshot.quantity, snapshot.last_movement_id) if snapshot else (0, 0)
+
+    tail = await db.scalar(
+        select(func.coalesce(func.sum(StockMovement.delta), 0)).where(
+            StockMovement.product_id == product_id,
+            StockMovement.id > after_id,
+            StockMovement.created_at <= at,
+        )
+    )
+    return base_quantity + tail
+
+
+# ======================================================================
+# POST: Write a batch of stock movements
+# ======================================================================
+# Body:
+#   {"movements": [{"product_id": 1, "kind": "receipt", "delta": 20, "reference": "PO-77"},
+#                  {"product_id": 2, "kind": "sale", "delta": -1}],
+#    "no_negative": true}
+@router.post("/movements")
+async def Add_movements(body: MovementBatch, db: AsyncSession = Depends(get_db)):
+    movements = [m.model_dump() for m in body.movements]
+
+    applied = await apply_movements(db, movements, body.no_negative)
+    await db.commit()
+
+    await events.products_changed(rows=applied.values())
+
+    refused = list({m["product_id"] for m in movements if m["product_id"] not in applied})
+    return {
+        "applied": [{"id": id, "quantity": row["quantity"]} for id, row in applied.items()],
+        "rejected": await rejection_reasons(db, refused),
+    }
+
+
+# ======================================================================
+# POST: Take a snapshot checkpoint now
+# ======================================================================
+# Can be called by a cron job, or set LEDGER_CHECKPOINT_INTERVAL (seconds)
+# to let the app do it by itself.
+@router.post("/movements/checkpoint")
+async def Take_checkpoint(db: AsyncSession = Depends(get_db)):
+    return await checkpoint(db)
+
+
+# ======================================================================
+# GET: Stock of a product at a point in time
+# ======================================================================
+# GET /products/1/stock?at=2026-01-31T23:59:59Z   (no "at" → now)
+@router.get("/products/{id}/stock")
+async def Stock_at(id: int, at: Optional[datetime] = None, db: AsyncSession = Depends(get_read_db)):
+    at = as_utc(at) if at else utcnow()
+    return {"id": id, "at": at, "quantity": await stock_at(db, id, at)}
+
+
+# ======================================================================
+# GET: Stock movement summary for a period
+# ======================================================================
+# GET /products/1/movements/summary?start=2026-01-01T00:00:00Z&end=2026-02-01T00:00:00Z
+#
+# opening  → stock at start
+# closing  → stock at end
+# by_kind  → total delta per kind inside the period (start, end]
+@router.get("/products/{id}/movements/summary")
+async def Movement_summary(
+    id: int,
+    start: datetime = Query(...),
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    start = as_utc(start)
+    end = as_utc(end) if end else utcnow()
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+
+    rows = await db.execute(
+        select(StockMovement.kind, func.sum(StockMovement.delta), func.count())
+        .where(
+            StockMovement.product_id == id,
+            StockMovement.created_at > start,
+            StockMovement.created_at <= end,
+        )
+        .group_by(StockMovement.kind)
+    )
+    by_kind = {kind: {"delta": int(total), "movements": count} for kind, total, count in rows}
+
+    return {
+        "id": id,
+        "start": start,
+        "end": end,
+        "opening": await stock_at(db, id, start),
+        "closing": await stock_at(db, id, end),
+        "by_kind": by_kind,
+    }
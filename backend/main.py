@@ -1,14 +1,83 @@
-from fastapi import FastAPI
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from models import Product, ProductUpdate
-from database import session, engine
+from sqlalchemy import func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from models import Product, ProductPage, ProductUpdate
+from database import dispose_engine, get_engine, open_session, pool_stats, session
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, keyset_query, like_pattern, page_result
+from serialization import FastJSONResponse, product_columns, product_row_to_dict, product_to_dict, to_json
+from singleflight import BatchLoader
 import DB_ORM_Model
+import admission
+import analytics
+import batch
+import bulkupdate
+import cache
+import events
+import export
+import health
+import ledger
+import metrics
+import replicas
+import search
+import stock
+import sync
+import warehouses
+import writebatch
+
+
+# Startup and shutdown (lifespan)
+# ---------------------------------------------------------
+# Importing this file does nothing with the database. When the server starts:
+#   1. the database work (init_db further below + pool warmup) runs as a
+#      background task with retries, see health.py
+#   2. we wait up to STARTUP_WAIT seconds for it, so in the normal case the
+#      tables exist before the first request. If the database is down the
+#      worker starts anyway and /readyz answers 503 until it is ready.
+#   3. the stock checkpoint loop starts (if enabled)
+# On shutdown the background tasks are stopped and the pool is closed.
+STARTUP_WAIT = float(os.getenv("STARTUP_WAIT", "5"))
+
+background_tasks = set()  # keep a reference, or a task could be garbage collected
+
+
+@asynccontextmanager
+async def lifespan(app):
+    startup = asyncio.create_task(health.prepare(init_db))
+    background_tasks.add(startup)
+    await asyncio.wait({startup}, timeout=STARTUP_WAIT)
+
+    start_checkpoints()
+    if replicas.REPLICA_URLS:
+        background_tasks.add(asyncio.create_task(replicas.monitor_loop()))
+
+    yield
+
+    await writebatch.batcher.close()  # save the writes still waiting for a group commit
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await dispose_engine()
 
 
 # FastAPI application is created here.
 # This object holds all API routes and configuration.
 # FastAPI itself does NOT run a server — Uvicorn will run this app later.
-app = FastAPI()
+# default_response_class → every dict / list answer is written with orjson
+# (see serialization.py)
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+
+# Admission control (see admission.py)
+# ---------------------------------------------------------
+# Added first → innermost: the CORS headers and the metrics also cover
+# the fast 503 answers it gives under overload.
+app.add_middleware(admission.AdmissionMiddleware)
 
 # CORS Middleware
 # ---------------------------------------------------------
@@ -33,21 +102,59 @@ app.add_middleware(
     allow_headers=["*"],                       # Allow all headers
 )
 
+# Read-your-writes for the read replicas (see replicas.py)
+app.add_middleware(replicas.ReadYourWritesMiddleware)
+
+# Request metrics (see metrics.py)
+# ---------------------------------------------------------
+# Added last → it is the outermost middleware, so the time of every other
+# middleware is included in the latency it records.
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+# Routes that live in other files
+# ---------------------------------------------------------
+# They are added BEFORE the routes below on purpose:
+# FastAPI checks routes in the order they were added, and "/products/{id}"
+# would otherwise also catch paths like "/products/export".
+app.include_router(export.router)   # GET /products/export
+app.include_router(analytics.router) # GET /products/stats, GET /products/low-stock
+app.include_router(batch.router)    # POST /products/batch
+app.include_router(bulkupdate.router) # POST /products/bulk-update
+app.include_router(search.router)   # GET /products/search
+app.include_router(sync.router)     # GET /products/changes
+app.include_router(stock.router)    # POST /products/adjust, POST /products/{id}/adjust
+app.include_router(ledger.router)   # /movements, GET /products/{id}/stock
+app.include_router(events.router)   # GET /products/stream
+app.include_router(metrics.router)  # GET /metrics
+app.include_router(health.router)   # GET /healthz, GET /readyz
+app.include_router(replicas.router) # GET /db/replicas
+app.include_router(writebatch.router) # GET /db/write-batches
+app.include_router(admission.router) # GET /admission
+app.include_router(warehouses.router) # /warehouses/..., GET /products/{id}/locations
+
 
 # Create ORM tables in the database when app starts
 # ---------------------------------------------------------
 # SQLAlchemy ORM maps classes → database tables.
 # metadata.create_all(bind=engine) will create those tables
 # if they do NOT already exist.
-DB_ORM_Model.Base.metadata.create_all(bind=engine) #this will create the ORM tables when uh run the main file
+# The engine is async, so this runs at startup (see init_db below)
+# through conn.run_sync(), which calls the normal create_all for us.
+#
+# In production the schema is usually managed outside the app: set
+# DB_CREATE_SCHEMA=0 and DB_SEED_SAMPLE=0 for a faster start.
+CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "1") == "1"
+SEED_SAMPLE = os.getenv("DB_SEED_SAMPLE", "1") == "1"
 
-# Create a database session object
+
+# Database session per request
 # ---------------------------------------------------------
-# session() comes from database.py and returns a DB connection.
-# Using this session object, SQLAlchemy lets you query and modify data
-# WITHOUT manually writing SQL queries.
-db = session( ) #this is teh database object, becoz session is the databse calss uh can say
-# db.query() → here in this uh need to write the query, but not the actual SQL query
+# There is NO global session object. Each route asks for one with
+#     db: AsyncSession = Depends(get_db)
+# get_db() (in database.py) opens a session from the connection pool
+# and closes it again when the request is finished.
+# db.execute(select(...)) → here in this uh need to write the query, but not the actual SQL query
 # becoz uh r using SQLALCHEMY ORM. Instead uh create Python classes (models)
 # so SQLAlchemy auto-generates the SQL.
 
@@ -68,59 +175,171 @@ Products = [
 # Initialize database with sample data
 # ---------------------------------------------------------
 # Steps:
-# 1. COUNT rows in Product table.
-# 2. If table is EMPTY → insert initial sample products.
+# 1. Create the tables (only the missing ones) and the search index.
+# 2. COUNT rows in Product table.
+# 3. If table is EMPTY → insert initial sample products.
 #
 # Why?
 # - If you restart app repeatedly, inserting same records again will cause
 #   duplicate key errors. So we only insert example data once.
-def init_db():
-    count = db.query(DB_ORM_Model.Product).count #this will give the count of teh rows, so its not zoro, the qurry below in thr for loop willl not run, becoz inserting duplicate values will casuse error
-    
-    # NOTE: `.count` is a function — it must be called → `.count()`
-    # But since you kept `.count`, we will not correct it here.
-
-    if count ==0:
-        # Convert Pydantic Product → ORM Product
+#
+# Safe to run again and again (health.prepare retries it until it works).
+async def init_db():
+    if CREATE_SCHEMA:
+        async with get_engine().begin() as conn:
+            await conn.run_sync(DB_ORM_Model.Base.metadata.create_all) #this will create the ORM tables when uh run the main file
+        await search.ensure_search_index()  # trigram / full text indexes (see search.py)
+
+    if not SEED_SAMPLE:
+        return
+
+    async with session() as db:  # startup is not a request, so it opens its own session
+        # await db.scalar(...) RUNS the count query and gives back the number
+        count = await db.scalar(select(func.count()).select_from(DB_ORM_Model.Product))
+        if count != 0:
+            return
+
+        # Convert Pydantic Product → rows and insert them all at once
         # -----------------------------------------------------
         # p.model_dump() converts Pydantic model into a dictionary.
-        # DB_ORM_Model.Product(**dict) converts dict → ORM object.
+        # Passing the whole list to ONE insert() sends a single statement,
+        # instead of one INSERT per db.add().
         #
         # Example:
         # Product(id=1 ...)  →  {"id":1,...}
-        # DB_ORM_Model.Product(**{"id":1,...}) → ORM row object
-        for p in Products: #conver the producst  into the mapped product DB_ORM_Model() using the type convertinf feature of python
-            db.add(DB_ORM_Model.Product(**p.model_dump()))   #p is converted into the ORM mapped table object from teh models, this will add the product list into teh databse, uh dont need to write the SQL queries brecoz uh have sql alchemy
-    
-    db.commit()   # Saves everything to DB
+        await db.execute(insert(DB_ORM_Model.Product), [p.model_dump() for p in Products])
+        await ledger.record_movements(
+            db, [{"product_id": p.id, "kind": "opening", "delta": p.quantity} for p in Products]
+        )
 
+        try:
+            await db.commit()   # Saves everything to DB
+        except IntegrityError:
+            # another worker inserted the samples at the same moment → nothing to do
+            await db.rollback()
 
-# Run initialization when server starts
-init_db()
+
+# Periodic stock snapshots (see ledger.py)
+# ---------------------------------------------------------
+# Only when LEDGER_CHECKPOINT_INTERVAL (seconds) is set, otherwise call
+# POST /movements/checkpoint from a cron job.
+def start_checkpoints():
+    if ledger.CHECKPOINT_INTERVAL > 0:
+        task = asyncio.create_task(ledger.checkpoint_loop(ledger.CHECKPOINT_INTERVAL))
+        background_tasks.add(task)
+
+
+# Initialization runs when the server starts (the lifespan above),
+# not when this file is imported.
 
 
 
 # ======================================================================
-# GET: Fetch all products
+# GET: Fetch products — one page at a time
 # ======================================================================
-@app.get("/products")
-def All_products():
+# Query parameters:
+#   limit  → how many products in one page (max 500)
+#   cursor → "next_cursor" from the previous page, leave empty for page 1
+#   sort   → id / name / price / quantity
+#   order  → asc / desc
+#   q      → text filter on name or description
+#
+# Response:
+#   {"items": [...products...], "next_cursor": "..." or null}
+#
+# The frontend keeps sending next_cursor back until it becomes null.
+SORT_FIELDS = {
+    "id": DB_ORM_Model.Product.id,
+    "name": DB_ORM_Model.Product.name,
+    "price": DB_ORM_Model.Product.price,
+    "quantity": DB_ORM_Model.Product.quantity,
+}
+
+
+@app.get("/products", response_model=ProductPage)
+async def All_products(
+    request: Request,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    sort: Literal["id", "name", "price", "quantity"] = "id",
+    order: Literal["asc", "desc"] = "asc",
+    q: Optional[str] = None,
+):
     # return Products
     # pass
 
-    # ORM Query:
-    # db.query(...).all() fetches all database rows.
-    # SQLAlchemy automatically converts them into Python objects.
-    db_products = db.query(DB_ORM_Model.Product).all() #this will return all the products
-    
-    return db_products
+    # Cache check first (see cache.py)
+    # ---------------------------------------------------------
+    # The version moves on every product write, so the same version + same
+    # parameters always means the same page → same ETag.
+    # If the browser already has it, answer 304 without touching the database.
+    q = q.strip() if q else None
+    params = f"{limit}:{cursor}:{sort}:{order}:{q}"
+    version = await cache.products_version()
+    etag = cache.etag_for(version, params)
+
+    if cache.is_not_modified(request, etag, version):
+        return cache.not_modified_response(etag, version)
+
+    async def load_page():
+        # read replica, if one already has every write up to this version (see replicas.py)
+        async with replicas.open_read_session(version / 1_000_000) as db:
+            # Core Query:
+            # select(<columns>) builds the SELECT, nothing is sent to the DB yet.
+            # The filter, ORDER BY and LIMIT are added to it and only one page is fetched.
+            # Plain columns (not the ORM class) → the rows come back as light tuples,
+            # no ORM objects are built (see serialization.py).
+            stmt = select(*product_columns(DB_ORM_Model.Product))
+
+            if q:
+                pattern = like_pattern(q)
+                stmt = stmt.where(
+                    or_(
+                        DB_ORM_Model.Product.name.ilike(pattern, escape="\\"),
+                        DB_ORM_Model.Product.description.ilike(pattern, escape="\\"),
+                    )
+                )
+
+            sort_col = SORT_FIELDS[sort]
+            stmt = keyset_query(stmt, sort_col, DB_ORM_Model.Product.id, order, cursor, limit)
+
+            # await → while the DB is working, this worker can serve other requests
+            rows = (await db.execute(stmt)).all()
+            rows, next_cursor = page_result(rows, sort_col, limit)
+
+        return to_json({"items": [product_row_to_dict(row) for row in rows], "next_cursor": next_cursor})
+
+    body = await cache.get_or_load(cache.list_key(version, params), load_page, version)
+    return cache.cached_json_response(body, etag, version)
+
+
+# Product rows by (id, cache version), for GET /products/{id}
+# ---------------------------------------------------------
+# The BatchLoader (see singleflight.py) collects the ids asked for in the same
+# event loop turn, so a burst of single-product reads becomes ONE query:
+#     SELECT <columns> FROM "Product" WHERE id IN (3, 7, 9)   (primary key lookups)
+# The replica must have every write up to the newest version in the batch.
+async def load_products(keys):
+    written_at = max(version for _, version in keys) / 1_000_000
+    async with replicas.open_read_session(written_at) as db:
+        rows = (await db.execute(
+            select(*product_columns(DB_ORM_Model.Product))
+            .where(DB_ORM_Model.Product.id.in_({id for id, _ in keys}))
+        )).all()
+
+    by_id = {row.id: product_row_to_dict(row) for row in rows}
+    return {key: by_id.get(key[0]) for key in keys}
+
+
+PRODUCT_BATCH_DELAY_MS = float(os.getenv("PRODUCT_BATCH_DELAY_MS", "0"))
+product_loader = BatchLoader("products_by_id", load_products, delay_ms=PRODUCT_BATCH_DELAY_MS)
 
 
 # ======================================================================
 # GET: Fetch a single product by ID
 # ======================================================================
-@app.get("/products/{id}")
-def Get_product(id: int):
+@app.get("/products/{id}", responses={200: {"model": Product}})
+async def Get_product(id: int, request: Request):
     # OLD LIST LOGIC (not needed now):
     # for i in range(len(Products)):
     #     if Products[i].id == id:
@@ -128,15 +347,25 @@ def Get_product(id: int):
     #         return "Product edited successfully"
     # return "Product does not exist"
 
-    # ORM Query:
-    # filter() → WHERE id = ?
-    # first() → fetch first matching row
-    db_product = db.query(DB_ORM_Model.Product).filter(DB_ORM_Model.Product.id == id).first()
-    
-    if db_product:
-        return db_product
-    
-    return "product not found"
+    async def load_product():
+        # merged with the lookups of other ids into one query (see load_products below)
+        row = await product_loader.load((id, version))
+        if row:
+            return to_json(row)
+        return None  # not found is not cached
+
+    version = await cache.products_version()
+    body = await cache.get_or_load(cache.product_key(id), load_product, version)
+
+    if body is None:
+        return "product not found"
+
+    # The ETag comes from the JSON itself, so it only changes when this product changes
+    etag = cache.etag_for(body)
+    if cache.is_not_modified(request, etag, version):
+        return cache.not_modified_response(etag, version)
+
+    return cache.cached_json_response(body, etag, version)
 
 
 
@@ -144,13 +373,24 @@ def Get_product(id: int):
 # ======================================================================
 # POST: Add new product
 # ======================================================================
+# The writes below put their statements in a work(db) function and hand it to
+# writebatch.run_write(): it commits it on its own, or together with other
+# writes when WRITE_BATCHING=1 (group commit, see writebatch.py).
+# run_write() only returns after the commit, so the change is published after it.
 @app.post("/products")
-def Add_product(product: Product):
+async def Add_product(product: Product):
     # Products.append(product)
 
-    # Convert Pydantic → ORM → Save to DB
-    db.add(DB_ORM_Model.Product(**product.model_dump()))
-    db.commit()
+    async def work(db):
+        # new row version for the delta sync (see sync.py)
+        stamp = sync.stamp(db)
+        # Convert Pydantic → ORM → Save to DB
+        db.add(DB_ORM_Model.Product(**product.model_dump(), **stamp))
+        # the starting quantity is the first line of the stock ledger
+        await ledger.record_movements(db, [{"product_id": product.id, "kind": "opening", "delta": product.quantity}])
+
+    await writebatch.run_write(work)
+    await events.products_changed(rows=[product.model_dump()])  # after the commit, so nobody re-caches the old value
     
     return "Product added in the list"
 
@@ -160,39 +400,140 @@ def Add_product(product: Product):
 # PUT: Full update — replace all fields
 # ======================================================================
 @app.put("/products/{id}")
-def edit_product(id: int, product: Product):
+async def edit_product(id: int, product: Product):
+
+    async def work(db):
+        stamp = sync.stamp(db)  # row version for the delta sync (see sync.py)
 
-    # Step 1: fetch existing product
-    db_product = db.query(DB_ORM_Model.Product).filter(DB_ORM_Model.Product.id==id).first()
+        # Step 1: fetch existing product
+        # (FOR UPDATE → locked until commit, so the old quantity stays true for the ledger)
+        db_product = await db.get(DB_ORM_Model.Product, id, with_for_update=True)
+        if db_product is None:
+            return None
+
+        # a new quantity is written to the stock ledger as an adjustment
+        await ledger.record_movements(
+            db, [{"product_id": id, "kind": "adjustment", "delta": product.quantity - (db_product.quantity or 0)}]
+        )
 
-    if db_product:
         # Step 2: Set new values (override entire object)
         db_product.name = product.name
         db_product.description = product.description
         db_product.price = product.price
         db_product.quantity = product.quantity
-        
-        # Step 3: Save
-        db.commit()
+        db_product.version = stamp["version"]
+        db_product.updated_at = stamp["updated_at"]
+        return product_to_dict(db_product)
+
+    # Step 3: Save
+    row = await writebatch.run_write(work)
 
+    if row:
+        await events.products_changed(rows=[row])
     else:
         return "no product found"
 
 
 
+# ======================================================================
+# PATCH: Partial update — only the fields that are sent
+# ======================================================================
+# Body: any of name / description / price / quantity (models.ProductUpdate)
+#   {"price": 150}  → only the price changes
+#
+# ONE statement: UPDATE ... SET <sent fields> WHERE id = ? RETURNING *
+# (no SELECT first, so no read-modify-write race)
+# Only when the quantity is sent, the old one is read (FOR UPDATE) so the
+# difference can be written to the stock ledger.
+@app.patch("/products/{id}", response_model=Product)
+async def patch_product(id: int, product: ProductUpdate):
+    changes = product.model_dump(exclude_unset=True, exclude_none=True)
+
+    if not changes:
+        async with open_session() as db:
+            db_product = await db.get(DB_ORM_Model.Product, id)
+        if db_product is None:
+            raise HTTPException(status_code=404, detail="product not found")
+        return product_to_dict(db_product)
+
+    async def work(db):
+        stamp = sync.stamp(db)  # row version for the delta sync (see sync.py)
+
+        old_quantity = None
+        if "quantity" in changes:
+            old_quantity = await db.scalar(
+                select(DB_ORM_Model.Product.quantity).where(DB_ORM_Model.Product.id == id).with_for_update()
+            )
+
+        stmt = (
+            update(DB_ORM_Model.Product)
+            .where(DB_ORM_Model.Product.id == id)
+            .values(**changes, **stamp)
+            .returning(*product_columns(DB_ORM_Model.Product))
+        )
+        row = (await db.execute(stmt)).mappings().first()
+        if row is None:
+            return None
+
+        if "quantity" in changes:
+            await ledger.record_movements(
+                db, [{"product_id": id, "kind": "adjustment", "delta": changes["quantity"] - (old_quantity or 0)}]
+            )
+        return dict(row)
+
+    row = await writebatch.run_write(work)
+    if row is None:
+        raise HTTPException(status_code=404, detail="product not found")
+
+    await events.products_changed(rows=[row])
+    return row
+
+
+
 # ======================================================================
 # DELETE: Remove product
 # ======================================================================
 @app.delete("/products/{id}")
-def delete_product(id: int): 
+async def delete_product(id: int):
 
-    # Step 1: Find product in DB
-    db_product = db.query(DB_ORM_Model.Product).filter(DB_ORM_Model.Product.id == id).first()
+    async def work(db):
+        # Step 1: Find product in DB
+        db_product = await db.get(DB_ORM_Model.Product, id)
+        if db_product is None:
+            return False
 
-    if db_product:
         # Step 2: Delete ORM object
-        db.delete(db_product)
-        db.commit()
+        # (the stock leaves the books, the ledger history stays)
+        await ledger.record_movements(db, [{"product_id": id, "kind": "removal", "delta": -(db_product.quantity or 0)}])
+        await db.delete(db_product)
+        await sync.record_deletes(db, [id], sync.next_version(db))  # tombstone for the delta sync
+        return True
+
+    if await writebatch.run_write(work):
+        await events.products_changed(deleted_ids=[id])
         return {"message": "product deleted"}
 
     return {"error": "not found"}
+
+
+
+# ======================================================================
+# GET: Connection pool statistics
+# ======================================================================
+# Shows how many connections are in use, how full the pool is (saturation)
+# and how long requests waited to get a connection.
+# If wait times grow or saturation stays near 1.0, the pool is too small
+# for the number of workers (or Postgres is the bottleneck).
+@app.get("/db/pool")
+async def Pool_stats():
+    return pool_stats.snapshot()
+
+
+# ======================================================================
+# GET: Cache statistics
+# ======================================================================
+# hits / misses / hit_ratio of the product read cache, and how many
+# requests were answered with 304 Not Modified.
+@app.get("/cache/stats")
+async def Cache_stats():
+    return cache.stats.snapshot()
@@ -0,0 +1,432 @@
+#this file has the METRICS of the app: where does the time of a request go?
+#every request is timed per route, every SQL query is counted and timed,
+#and everything can be scraped by Prometheus on GET /metrics
+
+# How it works
+# ---------------------------------------------------------
+# 1. MetricsMiddleware wraps the whole app (added in main.py).
+#    It counts the request as "in flight", and when the response is done
+#    records the latency in a histogram per route. The route is the template
+#    the router matched ("/products/{id}", not "/products/17"), so the
+#    number of series stays small.
+# 2. The request also gets a RequestStats object in a context variable.
+#    The SQLAlchemy engine events below (before / after_cursor_execute) add
+#    every query and its time to it. Context variables follow the request
+#    through dependencies and awaits, so concurrent requests never mix.
+#    A query shared by several requests (singleflight.BatchLoader) is added
+#    to each of them.
+#    The numbers are also sent back in a Server-Timing header:
+#        Server-Timing: db;dur=3.1;desc="2 queries", app;dur=4.7
+#    (browsers show it in the network tab).
+# 3. A query slower than SLOW_QUERY_MS is logged with its FINGERPRINT: the
+#    SQL with all values replaced by ?, so the same query with other ids
+#    always gets the same short hash and can be grouped in the logs.
+#
+# Profiler (opt-in)
+# ---------------------------------------------------------
+# PROFILING_ENABLED=1 and the header "X-Profile: 1" on a request → a thread
+# samples the stack of the event loop thread every PROFILE_INTERVAL_MS while
+# that request runs, and writes the hot stacks in "collapsed" format
+# (one line per stack: "a;b;c 12") to PROFILE_DIR. The file name is sent back
+# in X-Profile-File. Open it with flamegraph.pl or speedscope.app.
+# The event loop also runs other requests meanwhile, so profile on a quiet
+# server (or with the load test off) for a clean picture.
+
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from fastapi import APIRouter, Response
+from sqlalchemy import event
+
+from database import current_request, on_engine_created, pool_stats
+import admission
+import cache
+import events
+import replicas
+import singleflight
+import writebatch
+
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Queries slower than this (milliseconds) are logged with their fingerprint
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# Histogram bucket upper bounds in seconds (like the Prometheus client defaults)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+# Histogram
+# ---------------------------------------------------------
+# Counts how many values fell in each bucket, plus the sum and the count.
+# Prometheus computes p50 / p95 / p99 from the buckets (histogram_quantile).
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    # Prometheus buckets are cumulative: le="0.1" counts everything <= 0.1
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+# Everything we measure (for this process)
+# ---------------------------------------------------------
+# Keys are (method, route) or (method, route, status).
+# All updates happen on the event loop thread, so no lock is needed.
+class Metrics:
+    def __init__(self):
+        self.requests = Counter()        # (method, route, status) → count
+        self.latency = {}                # (method, route) → Histogram
+        self.in_flight = Counter()       # method → requests running now
+        self.db_queries = Counter()      # (method, route) → queries sent
+        self.db_seconds = Counter()      # (method, route) → time spent in queries
+        self.query_latency = Histogram(QUERY_BUCKETS)
+        self.slow_queries = Counter()    # fingerprint → count
+        self.slow_examples = {}          # fingerprint → SQL (first one seen)
+
+    def request_done(self, key, status, seconds, stats):
+        self.requests[key + (status,)] += 1
+        self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+        self.db_queries[key] += stats.queries
+        self.db_seconds[key] += stats.query_seconds
+
+
+metrics = Metrics()
+
+
+# Per-request counters (see the engine events below)
+class RequestStats:
+    __slots__ = ("queries", "query_seconds", "scope")
+
+    def __init__(self, scope):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.scope = scope
+
+    # (method, route template), known once the router has matched the request
+    @property
+    def key(self):
+        return (self.scope["method"], route_of(self.scope))
+
+
+
+# Statement fingerprint
+# ---------------------------------------------------------
+# SELECT ... WHERE id IN (?, ?, ?) AND name = 'x' LIMIT 51
+#   → select ... where id in (?+) and name = ? limit ?
+# so every variant of the same query gets the same fingerprint.
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"\$\d+|%\(\w+\)s|(?<!:):\w+|\?")  # not the :: of a Postgres cast
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES = re.compile(r"(\(\?\+\))(?:\s*,\s*\(\?\+\))+")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    sql = _STRING.sub("?", statement)
+    sql = _PARAM.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("(?+)", sql)
+    sql = _VALUES.sub(r"\1", sql)  # multi-row VALUES (...), (...) → one group
+    return _SPACE.sub(" ", sql).strip().lower()
+
+
+def fingerprint_id(normalized):
+    return hashlib.blake2b(normalized.encode(), digest_size=4).hexdigest()
+
+
+# SQL instrumentation
+# ---------------------------------------------------------
+# The events live on the sync engine wrapped by the async engine (like the
+# pool events in database.py), attached when the engine is created.
+# The start time is kept on the execution context of the statement.
+def _before_query(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    metrics.query_latency.observe(seconds)
+
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += seconds
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        normalized = fingerprint(statement)
+        fid = fingerprint_id(normalized)
+        metrics.slow_queries[fid] += 1
+        metrics.slow_examples.setdefault(fid, normalized[:500])
+        route = " ".join(stats.key) if stats is not None else "-"
+        logger.warning("slow query %.1f ms [%s] route=%s: %s", seconds * 1000, fid, route, normalized[:500])
+
+
+@on_engine_created
+def _instrument(engine, name):
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_query)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_query)
+
+
+# Sampling profiler
+# ---------------------------------------------------------
+# A background thread looks at the stack of the event loop thread every
+# `interval` seconds (sys._current_frames) and counts how often each stack
+# was seen. Costs nothing when it is not running.
+class StackSampler:
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    # collapsed stack format: "outer;inner;innermost count", hottest first
+    def write(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def profile_path(method, path):
+    name = re.sub(r"[^A-Za-z0-9]+", "_", f"{method}{path}").strip("_")[:80]
+    return os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}.folded")
+
+
+# Route template of a request
+# ---------------------------------------------------------
+# The router puts the matched route in the scope, so /products/17 → "/products/{id}".
+# Unknown paths are all counted as "unmatched" (no series per random URL).
+def route_of(scope):
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+# The middleware (pure ASGI, so streaming responses are timed until the last byte)
+# ---------------------------------------------------------
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        sampler = None
+        if PROFILING_ENABLED and _header(scope, b"x-profile") == b"1":
+            sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+            sampler.start()
+            profile_file = profile_path(method, scope["path"])
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                timing = (f'db;dur={stats.query_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                          f"app;dur={elapsed_ms:.1f}")
+                headers = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+                if sampler is not None:
+                    headers.append((b"x-profile-file", profile_file.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        metrics.in_flight[method] += 1
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.in_flight[method] -= 1
+            metrics.request_done(stats.key, status, time.perf_counter() - started, stats)
+            current_request.reset(token)
+            if sampler is not None:
+                sampler.stop()
+                sampler.write(profile_file)
+
+
+def _header(scope, name):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value
+    return None
+
+
+# Prometheus text format
+# ---------------------------------------------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    text = ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return "{" + text + "}"
+
+
+def _metric(lines, name, kind, help, samples):
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(**labels)} {value}")
+
+
+def _histogram(lines, name, help, histograms):
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, histogram in histograms:
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+
+
+def render():
+    lines = []
+
+    _metric(lines, "http_requests_total", "counter", "HTTP requests by route and status",
+            [({"method": m, "route": r, "status": s}, n) for (m, r, s), n in sorted(metrics.requests.items())])
+    _histogram(lines, "http_request_duration_seconds", "HTTP request latency by route",
+               [({"method": m, "route": r}, h) for (m, r), h in sorted(metrics.latency.items())])
+    _metric(lines, "http_requests_in_flight", "gauge", "HTTP requests running now",
+            [({"method": m}, n) for m, n in sorted(metrics.in_flight.items())])
+    _metric(lines, "http_request_db_queries_total", "counter", "SQL queries sent by requests of the route",
+            [({"method": m, "route": r}, n) for (m, r), n in sorted(metrics.db_queries.items())])
+    _metric(lines, "http_request_db_seconds_total", "counter", "Time spent in SQL queries by requests of the route",
+            [({"method": m, "route": r}, round(n, 6)) for (m, r), n in sorted(metrics.db_seconds.items())])
+
+    _histogram(lines, "db_query_duration_seconds", "SQL query latency", [({}, metrics.query_latency)])
+    _metric(lines, "db_slow_queries_total", "counter", f"SQL queries slower than {SLOW_QUERY_MS:g} ms by fingerprint",
+            [({"fingerprint": fid}, n) for fid, n in metrics.slow_queries.most_common()])
+
+    pool = pool_stats.snapshot()
+    _metric(lines, "db_pool_connections_in_use", "gauge", "Pool connections lent out", [({}, pool["in_use"])])
+    _metric(lines, "db_pool_saturation", "gauge", "In use / (pool size + overflow)", [({}, pool["saturation"])])
+    _metric(lines, "db_pool_checkouts_total", "counter", "Connections taken from the pool", [({}, pool["checkouts"])])
+    _metric(lines, "db_pool_timeouts_total", "counter", "Requests that got no connection in time", [({}, pool["timeouts"])])
+    _metric(lines, "db_pool_wait_max_seconds", "gauge", "Longest wait for a connection", [({}, pool["wait_max_ms"] / 1000)])
+
+    replica_state = replicas.replica_set.snapshot()
+    _metric(lines, "db_reads_total", "counter", "Read sessions by database (and why the primary was used)",
+            [({"target": "primary", "reason": reason}, n) for reason, n in sorted(replica_state["primary_reads"].items())]
+            + [({"target": r["name"], "reason": "replica"}, r["reads"]) for r in replica_state["replicas"]])
+    _metric(lines, "db_replica_healthy", "gauge", "1 if the replica answered its last lag check",
+            [({"replica": r["name"]}, int(r["healthy"])) for r in replica_state["replicas"]])
+    _metric(lines, "db_replica_lag_seconds", "gauge", "Replication lag measured by the monitor",
+            [({"replica": r["name"]}, r["lag_s"]) for r in replica_state["replicas"] if r["lag_s"] is not None])
+
+    batching = writebatch.batcher.snapshot()
+    _metric(lines, "write_batches_total", "counter", "Group commits (WRITE_BATCHING=1)", [({}, batching["batches"])])
+    _metric(lines, "write_batch_writes_total", "counter", "Writes saved through group commits", [({}, batching["writes"])])
+    _metric(lines, "write_batch_failed_total", "counter", "Writes of a group commit that failed", [({}, batching["failed"])])
+
+    admitted = admission.controller.snapshot()
+    _metric(lines, "admission_in_flight", "gauge", "Requests running under the admission limit", [({}, admitted["in_flight"])])
+    _metric(lines, "admission_queue_depth", "gauge", "Requests waiting for an admission slot", [({}, admitted["queued"])])
+    _metric(lines, "admission_admitted_total", "counter", "Requests admitted, by priority",
+            [({"priority": p}, n) for p, n in admitted["admitted"].items()])
+    _metric(lines, "admission_shed_total", "counter", "Requests answered with 503 by admission control",
+            [({"priority": s["priority"], "reason": s["reason"]}, s["count"]) for s in admitted["shed"]])
+
+    cached = cache.stats.snapshot()
+    _metric(lines, "cache_hits_total", "counter", "Product cache hits", [({}, cached["hits"])])
+    _metric(lines, "cache_misses_total", "counter", "Product cache misses", [({}, cached["misses"])])
+    _metric(lines, "cache_not_modified_total", "counter", "Requests answered with 304", [({}, cached["not_modified"])])
+    _metric(lines, "cache_invalidations_total", "counter", "Product writes that cleared the cache", [({}, cached["invalidations"])])
+    _metric(lines, "cache_coalesced_total", "counter", "Cache misses that shared the load of an identical miss", [({}, cached["coalesced"])])
+
+    loaded = {name: loader.snapshot() for name, loader in singleflight.loaders.items()}
+    _metric(lines, "batch_loader_batches_total", "counter", "Batched lookup queries",
+            [({"loader": name}, s["batches"]) for name, s in loaded.items()])
+    _metric(lines, "batch_loader_keys_total", "counter", "Keys looked up through batched queries",
+            [({"loader": name}, s["keys"]) for name, s in loaded.items()])
+    _metric(lines, "batch_loader_db_queries_total", "counter",
+            "SQL queries sent by batched lookups (each one is also counted for every request that waited for it)",
+            [({"loader": name}, s["queries"]) for name, s in loaded.items()])
+
+    stream = events.broadcaster.snapshot()
+    _metric(lines, "stream_clients", "gauge", "Open /products/stream connections", [({}, stream["clients"])])
+    _metric(lines, "stream_events_published_total", "counter", "Change events published", [({}, stream["published"])])
+    _metric(lines, "stream_slow_client_resyncs_total", "counter", "Slow clients sent a resync", [({}, stream["slow_client_resyncs"])])
+
+    return "\n".join(lines) + "\n"
+
+
+# ======================================================================
+# GET: Prometheus metrics
+# ======================================================================
+# prometheus.yml:
+#   scrape_configs:
+#     - job_name: inventory
+#       static_configs: [{targets: ["localhost:8000"]}]
+@router.get("/metrics", include_in_schema=False)
+async def Metrics_endpoint():
+    return Response(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ======================================================================
+# GET: Slow query fingerprints
+# ======================================================================
+# The SQL behind the fingerprints in db_slow_queries_total, most frequent first.
+@router.get("/metrics/slow-queries")
+async def Slow_queries():
+    return [
+        {"fingerprint": fid, "count": count, "sql": metrics.slow_examples[fid]}
+        for fid, count in metrics.slow_queries.most_common()
+    ]
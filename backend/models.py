@@ -19,3 +19,145 @@ class ProductUpdate(BaseModel):
     description: Optional[str] = None
     price: Optional[int] = None
     quantity: Optional[int] = None
+
+
+# StockAdjustment model - used for POST /products/{id}/adjust
+# quantity = quantity + delta, done by the database in one UPDATE
+class StockAdjustment(BaseModel):
+    delta: int                  # +5 = 5 items received, -2 = 2 items picked
+    no_negative: bool = False   # True → refuse the change if stock would go below 0
+
+
+# One line of a batch adjustment
+class StockDelta(BaseModel):
+    id: int                     # Product ID
+    delta: int
+
+
+# BatchStockAdjustment model - used for POST /products/adjust (many SKUs in one statement)
+class BatchStockAdjustment(BaseModel):
+    items: list[StockDelta]
+    no_negative: bool = False
+
+
+# Movement model - one line of the stock ledger (POST /movements)
+# delta is signed: receipts must be > 0, sales must be < 0
+from typing import Literal
+from pydantic import model_validator
+
+class Movement(BaseModel):
+    product_id: int
+    kind: Literal["receipt", "sale", "adjustment"]
+    delta: int
+    reference: Optional[str] = None   # order number, supplier note, ...
+
+    @model_validator(mode="after")
+    def check_sign(self):
+        if self.kind == "receipt" and self.delta <= 0:
+            raise ValueError("a receipt must have a positive delta")
+        if self.kind == "sale" and self.delta >= 0:
+            raise ValueError("a sale must have a negative delta")
+        return self
+
+
+# MovementBatch model - many ledger lines written in one transaction
+class MovementBatch(BaseModel):
+    movements: list[Movement]
+    no_negative: bool = False   # True → refuse products whose stock would go below 0
+
+
+# ProductPage model - response of GET /products and GET /products/low-stock
+class ProductPage(BaseModel):
+    items: list[Product]
+    next_cursor: Optional[str] = None   # send it back to get the next page, None = last page
+
+
+# SearchHit model - one product of GET /products/search, with its relevance
+class SearchHit(Product):
+    score: float                        # higher = better match
+
+
+# SearchResults model - response of GET /products/search (best match first)
+class SearchResults(BaseModel):
+    items: list[SearchHit]
+
+
+from pydantic import Field
+
+# At most this many ids in BulkFilter.ids: the list is sent with every chunk
+# statement (one bind parameter each), and the drivers allow ~32k per statement.
+# For more products use id_min / id_max or another condition.
+MAX_BULK_IDS = 10000
+
+
+# BulkFilter model - which products POST /products/bulk-update changes
+# All the conditions that are sent must match (AND).
+class BulkFilter(BaseModel):
+    ids: Optional[list[int]] = Field(None, max_length=MAX_BULK_IDS)
+    id_min: Optional[int] = None          # inclusive
+    id_max: Optional[int] = None          # inclusive
+    name_contains: Optional[str] = None   # case-insensitive
+    price_min: Optional[int] = None
+    price_max: Optional[int] = None
+    quantity_min: Optional[int] = None
+    quantity_max: Optional[int] = None
+    all_products: bool = False            # must be true to change every product (no condition)
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        conditions = self.model_dump(exclude={"all_products"}, exclude_none=True)
+        if not conditions and not self.all_products:
+            raise ValueError("send at least one condition, or all_products=true")
+        return self
+
+
+# BulkOperation model - what POST /products/bulk-update does to each product
+#   {"field": "price", "op": "multiply", "value": 1.1}   → +10 %, rounded
+#   {"field": "price", "op": "add", "value": -5}
+#   {"field": "quantity", "op": "set", "value": 0}       → written to the stock ledger
+class BulkOperation(BaseModel):
+    field: Literal["price", "quantity"]
+    op: Literal["set", "add", "multiply"]
+    value: float
+
+    @model_validator(mode="after")
+    def check_value(self):
+        if self.field == "quantity" and self.op != "set":
+            raise ValueError("stock can only be set here, use /products/adjust or /movements to move it")
+        if self.op != "multiply" and not self.value.is_integer():
+            raise ValueError(f"{self.op} needs a whole number")
+        if self.op == "multiply" and self.value < 0:
+            raise ValueError("multiply needs a value >= 0")
+        return self
+
+
+# BulkUpdate model - body of POST /products/bulk-update
+class BulkUpdate(BaseModel):
+    filter: BulkFilter
+    operation: BulkOperation
+    reference: Optional[str] = None   # stored on the ledger lines of a quantity change
+
+
+# Warehouse model - body of POST /warehouses
+class Warehouse(BaseModel):
+    id: int
+    code: str               # short unique name, e.g. "BLR-1"
+    name: Optional[str] = None
+
+
+# StockLevel model - body of PUT /warehouses/{id}/stock/{product_id}
+class StockLevel(BaseModel):
+    quantity: int
+
+
+# WarehouseStockItem model - one product in one warehouse
+class WarehouseStockItem(BaseModel):
+    product_id: int
+    quantity: int
+
+
+# WarehouseStockPage model - response of GET /warehouses/{id}/stock
+class WarehouseStockPage(BaseModel):
+    items: list[WarehouseStockItem]
+    next_cursor: Optional[str] = None
+
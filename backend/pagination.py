@@ -0,0 +1,148 @@
+#this file has the helpers for KEYSET (cursor) pagination of the products list
+#instead of sending the whole table to the frontend, the backend sends one page at a time
+
+# Why keyset and not OFFSET?
+# ---------------------------------------------------------
+# "LIMIT 50 OFFSET 100000" makes the database read and throw away 100000 rows
+# before it returns the 50 we want, so every next page gets slower.
+#
+# Keyset pagination remembers WHERE the last page ended (the sort value and id
+# of the last row) and asks for rows AFTER that point:
+#
+#     WHERE (price, id) > (123, 42) ORDER BY price, id LIMIT 50
+#
+# With an index on (price, id) the database jumps straight to that point,
+# so page 1 and page 10000 cost the same.
+
+import base64
+import json
+
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, and_, or_, tuple_
+
+
+# Default and maximum page sizes
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+# Cursor helpers
+# ---------------------------------------------------------
+# The cursor is just [sort_value, id] of the last row of the page,
+# turned into JSON and then base64 so it is safe inside a URL.
+# The frontend never looks inside it, it only sends it back.
+def encode_cursor(value, id):
+    raw = json.dumps([value, id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# value_col / id_col → the columns the two values are compared with.
+# A value that does not fit its column (text for price, a number for name,
+# too big for the integer column) is a 400 here instead of a database error.
+def decode_cursor(cursor, value_col=None, id_col=None):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+    id_ok = fits(id, id_col) if id_col is not None else isinstance(id, int) and not isinstance(id, bool)
+    if not id_ok or (value_col is not None and not fits(value, value_col)):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+    return value, id
+
+
+# Can the value be compared with the column?
+def fits(value, column):
+    if value is None:
+        return column.nullable
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:  # a type without a Python equivalent → no check
+        return True
+    if isinstance(value, bool):
+        return python_type is bool
+    if python_type is int:
+        bits = 63 if isinstance(column.type, BigInteger) else 31
+        return isinstance(value, int) and -2**bits <= value < 2**bits
+    if python_type is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, python_type)
+
+
+# Escape the LIKE wildcards typed by the user, so that searching
+# for "50%" looks for the text "50%" and not "50 followed by anything"
+def like_pattern(text):
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+# Apply the keyset filter, ORDER BY and LIMIT to a select()
+# ---------------------------------------------------------
+# sort_col  → column picked by the user (name / price / quantity / id)
+# id_col    → primary key, used as a tie breaker so the order is always unique
+# direction → "asc" or "desc"
+# cursor    → value from the previous page (or None for the first page)
+#
+# One extra row is fetched (limit + 1) only to know if there is a next page,
+# page_result() then cuts it off and builds the next cursor.
+#
+# NULL sort values (name / price / quantity allow them)
+# ---------------------------------------------------------
+# (name, id) > (NULL, 3) is NULL, not true, so a plain tuple compare would end
+# the list at the first NULL. NULLs are sorted as the highest values instead
+# (NULLS LAST ascending, NULLS FIRST descending: the Postgres default, and what
+# a plain (col, id) index gives) and the filter says where they are:
+#   asc,  cursor (v, 3)    → (col, id) > (v, 3) OR col IS NULL
+#   asc,  cursor (NULL, 3) → col IS NULL AND id > 3
+#   desc, cursor (v, 3)    → (col, id) < (v, 3)
+#   desc, cursor (NULL, 3) → col IS NULL AND id < 3 OR col IS NOT NULL
+def keyset_query(stmt, sort_col, id_col, direction, cursor, limit):
+    if sort_col is id_col:
+        keys = [id_col]
+    else:
+        keys = [sort_col, id_col]
+    nullable = sort_col is not id_col and sort_col.nullable
+
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor, sort_col, id_col)
+        stmt = stmt.where(after_cursor(sort_col, id_col, keys, direction, value, last_id, nullable))
+
+    if direction == "desc":
+        order = [k.desc() for k in keys]
+        if nullable:
+            order[0] = order[0].nulls_first()
+    else:
+        order = [k.asc() for k in keys]
+        if nullable:
+            order[0] = order[0].nulls_last()
+
+    return stmt.order_by(*order).limit(limit + 1)
+
+
+# The WHERE condition "comes after the cursor" (see above)
+def after_cursor(sort_col, id_col, keys, direction, value, last_id, nullable):
+    if sort_col is id_col:
+        return id_col < last_id if direction == "desc" else id_col > last_id
+
+    if direction == "desc":
+        if value is None:
+            return or_(and_(sort_col.is_(None), id_col < last_id), sort_col.is_not(None))
+        return tuple_(*keys) < tuple_(value, last_id)
+
+    if value is None:
+        return and_(sort_col.is_(None), id_col > last_id)
+    if nullable:
+        return or_(tuple_(*keys) > tuple_(value, last_id), sort_col.is_(None))
+    return tuple_(*keys) > tuple_(value, last_id)
+
+
+def page_result(rows, sort_col, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_col.key), last.id)
+
+    return rows, next_cursor
@@ -0,0 +1,221 @@
+#this file has the product SEARCH (typeahead) endpoint
+#GET /products/search?q=... finds products by name / description, best match first,
+#using a search index so it stays fast on a million products
+
+# How it works
+# ---------------------------------------------------------
+# The list route (GET /products?q=) uses LIKE '%...%', which reads every row.
+# Search uses a real index instead, and ranks the results:
+#
+# Postgres (pg_trgm extension + two GIN indexes)
+#   - full text: to_tsvector(name + description) @@ to_tsquery('mou:* & del:*')
+#     → every word of q, as a prefix, in any order     ("mou del" finds "mouse from dell")
+#   - fuzzy:     name % q   (trigram similarity)         ("keybaord" finds "KeyBoard")
+#   - prefix:    name ILIKE 'q%'  (same trigram index)
+#   score = ts_rank_cd (full text) + similarity (fuzzy) + 1 when the name starts with q
+#
+# SQLite (local runs): an FTS5 table "ProductSearch" kept in sync by triggers
+#   - full text + prefix: ProductSearch MATCH '"mou"* "del"*'
+#   score = bm25 (a hit in the name counts 10x more) + 1 when the name starts with q
+#   FTS5 has no typo tolerance, so fuzzy matching is Postgres only.
+#
+# Any other database, or an index that could not be created (no rights for
+# CREATE EXTENSION, SQLite without FTS5) → LIKE '%q%', names starting with q first.
+#
+# The indexes are created by ensure_search_index() from init_db in main.py
+# (with the tables, DB_CREATE_SCHEMA=1). All statements are "IF NOT EXISTS",
+# so an existing database gets them on the next start.
+
+import logging
+import re
+
+from fastapi import APIRouter, Query, Request
+from sqlalchemy import case, column, desc, func, literal_column, or_, select, table, text
+
+from database import get_engine
+from models import SearchResults
+from pagination import like_pattern
+from replicas import open_read_session
+from serialization import product_columns, product_row_to_dict, to_json
+import DB_ORM_Model
+import cache
+
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+Product = DB_ORM_Model.Product
+
+MAX_QUERY_LENGTH = 100
+MAX_WORDS = 8
+
+# The indexed document. The query must use the very same expression,
+# otherwise Postgres does not use the index.
+PG_DOCUMENT = "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, ''))"
+
+PG_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    'CREATE INDEX IF NOT EXISTS "ix_Product_name_trgm" ON "Product" USING gin (name gin_trgm_ops)',
+    f'CREATE INDEX IF NOT EXISTS "ix_Product_search_tsv" ON "Product" USING gin (({PG_DOCUMENT}))',
+]
+
+# External content table: FTS5 stores only the index, the text stays in Product.
+# prefix='2 3' → extra index entries for 2 and 3 letter prefixes (fast typeahead).
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS "ProductSearch" USING fts5(
+        name, description, content='Product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS "Product_search_insert" AFTER INSERT ON "Product" BEGIN
+        INSERT INTO "ProductSearch"(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "Product_search_delete" AFTER DELETE ON "Product" BEGIN
+        INSERT INTO "ProductSearch"("ProductSearch", rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    # only name / description changes touch the index, stock updates do not
+    """CREATE TRIGGER IF NOT EXISTS "Product_search_update" AFTER UPDATE OF id, name, description ON "Product" BEGIN
+        INSERT INTO "ProductSearch"("ProductSearch", rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO "ProductSearch"(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+search_table = table("ProductSearch", column("rowid"))
+
+# dialect name → "postgresql" / "fts5" / "like", found out on the first search
+_modes = {}
+
+
+# Create the search index (called from init_db in main.py)
+# ---------------------------------------------------------
+# A failure is only logged: search then falls back to LIKE, the app still starts.
+async def ensure_search_index():
+    engine = get_engine()
+    dialect = engine.dialect.name
+    _modes.pop(dialect, None)
+
+    if dialect == "postgresql":
+        statements = PG_SEARCH_DDL
+    elif dialect == "sqlite":
+        statements = SQLITE_SEARCH_DDL
+    else:
+        return
+
+    try:
+        async with engine.begin() as conn:
+            created = dialect == "sqlite" and not await conn.scalar(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'ProductSearch'"))
+            for statement in statements:
+                await conn.execute(text(statement))
+            if created:  # products already in the table → index them once
+                await conn.execute(text("""INSERT INTO "ProductSearch"("ProductSearch") VALUES ('rebuild')"""))
+    except Exception as e:
+        logger.warning("search index not created, search falls back to LIKE: %s", e)
+
+
+# Which kind of query this database can answer
+async def search_mode(db):
+    dialect = db.get_bind().dialect.name
+    if dialect not in _modes:
+        if dialect == "postgresql":
+            found = await db.scalar(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"))
+            _modes[dialect] = "postgresql" if found else "like"
+        elif dialect == "sqlite":
+            found = await db.scalar(text("SELECT 1 FROM sqlite_master WHERE name = 'ProductSearch'"))
+            _modes[dialect] = "fts5" if found else "like"
+        else:
+            _modes[dialect] = "like"
+    return _modes[dialect]
+
+
+# "Mouse, DEL" → ["mouse", "del"]; only letters / digits, so the words can be
+# put into a tsquery / MATCH string without any escaping problems
+def query_words(q):
+    return re.findall(r"\w+", q.lower())[:MAX_WORDS]
+
+
+# "mou" → "mou%" (LIKE pattern for "starts with")
+def prefix_pattern(q):
+    return like_pattern(q)[1:]
+
+
+def name_prefix_bonus(q):
+    return case((Product.name.ilike(prefix_pattern(q), escape="\\"), 1.0), else_=0.0)
+
+
+def postgres_query(q, words):
+    document = literal_column(PG_DOCUMENT)
+    tsquery = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{w}:*" for w in words))
+    score = func.ts_rank_cd(document, tsquery) + func.similarity(Product.name, q) + name_prefix_bonus(q)
+    return (
+        select(*product_columns(Product), score.label("score"))
+        .where(or_(
+            document.op("@@")(tsquery),
+            Product.name.op("%")(q),
+            Product.name.ilike(prefix_pattern(q), escape="\\"),
+        ))
+    )
+
+
+def fts5_query(q, words):
+    # bm25: lower = better, weights 10 for name, 1 for description
+    score = -literal_column('bm25("ProductSearch", 10.0, 1.0)') + name_prefix_bonus(q)
+    return (
+        select(*product_columns(Product), score.label("score"))
+        .select_from(Product.__table__.join(search_table, search_table.c.rowid == Product.id))
+        .where(literal_column('"ProductSearch"').op("MATCH")(" ".join(f'"{w}"*' for w in words)))
+    )
+
+
+def like_query(q, words):
+    pattern = like_pattern(q)
+    return (
+        select(*product_columns(Product), name_prefix_bonus(q).label("score"))
+        .where(or_(
+            Product.name.ilike(pattern, escape="\\"),
+            Product.description.ilike(pattern, escape="\\"),
+        ))
+    )
+
+
+QUERIES = {"postgresql": postgres_query, "fts5": fts5_query, "like": like_query}
+
+
+# ======================================================================
+# GET: Search products (typeahead)
+# ======================================================================
+# GET /products/search?q=mou&limit=10
+# → {"items": [{...product..., "score": 1.52}, ...]}, best match first.
+# Results are cached like the product list (see cache.py), per products version.
+@router.get("/products/search", response_model=SearchResults)
+async def Search_products(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=MAX_QUERY_LENGTH),
+    limit: int = Query(10, ge=1, le=50),
+):
+    q = " ".join(q.split())
+    words = query_words(q)
+    if not words:
+        return {"items": []}
+
+    params = f"{limit}:{q.lower()}"
+    version = await cache.products_version()
+    etag = cache.etag_for(version, "search", params)
+
+    if cache.is_not_modified(request, etag, version):
+        return cache.not_modified_response(etag, version)
+
+    async def load_results():
+        async with open_read_session(version / 1_000_000) as db:
+            stmt = QUERIES[await search_mode(db)](q, words)
+            rows = (await db.execute(stmt.order_by(desc("score"), Product.id).limit(limit))).all()
+
+        items = []
+        for row in rows:
+            item = product_row_to_dict(row)
+            item["score"] = round(float(item["score"]), 4)
+            items.append(item)
+        return to_json({"items": items})
+
+    body = await cache.get_or_load(cache.search_key(version, params), load_results, version)
+    return cache.cached_json_response(body, etag, version)
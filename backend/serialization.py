@@ -0,0 +1,58 @@
+#this file turns product rows into JSON bytes
+#used by the routes that cache their answer (the cache stores the finished JSON)
+#and by FastJSONResponse, the default response class of the app
+
+# Why not FastAPI's default?
+# ---------------------------------------------------------
+# Returning ORM objects makes FastAPI's jsonable_encoder walk every attribute
+# of every object (and skip SQLAlchemy's internal _sa_instance_state), and then
+# the standard json module writes the text. For big lists that is most of the time.
+#
+# The fast path used by the list routes:
+#   1. a Core select() of plain columns → rows are tuples, no ORM objects and
+#      no identity map
+#   2. row → dict with the column names (product_row_to_dict)
+#   3. orjson writes the JSON bytes (much faster than json, and does dates too)
+#
+# orjson is optional (pip install orjson); without it the json module is used.
+
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+PRODUCT_FIELDS = ["id", "name", "description", "price", "quantity"]
+
+
+def product_to_dict(db_product):
+    return {field: getattr(db_product, field) for field in PRODUCT_FIELDS}
+
+
+# Row from a Core select() → dict (the keys are the selected column names)
+def product_row_to_dict(row):
+    return dict(row._mapping)
+
+
+def product_columns(model):
+    table = model.__table__
+    return [table.c[field] for field in PRODUCT_FIELDS]
+
+
+def to_json(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), default=str).encode()
+
+
+# Response class that writes JSON with orjson
+# ---------------------------------------------------------
+# Set as default_response_class of the app, so every route returning a dict
+# or list gets it without changes.
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return to_json(content)
@@ -0,0 +1,163 @@
+#this file has the REQUEST COALESCING helpers for hot reads
+#many requests that want the same thing at the same moment share ONE database query
+
+# How it works
+# ---------------------------------------------------------
+# SingleFlight: identical reads share one call
+#   request A ─┐
+#   request B ─┼─► do("product:7@v", load) ─► ONE load() ─► same result for A, B and C
+#   request C ─┘
+#   The first caller starts load(), the others wait for the same result.
+#   When it is done the key is forgotten, the next caller loads again
+#   (so it only merges calls that overlap in time, it is not a cache).
+#   load() runs as its own task: if the first client goes away, the
+#   others still get their answer.
+#
+# BatchLoader: different keys, one query
+#   load(3), load(7), load(9) in the same event loop turn
+#       ─► load_many([3, 7, 9]) → SELECT ... WHERE id IN (3, 7, 9)
+#   Every caller gets its own row (or None). Set a small delay to collect
+#   lookups for longer than one loop turn (more merging, a bit more latency).
+#   The shared query is counted for EVERY request that waited for it (its
+#   metrics.RequestStats → /metrics per route, Server-Timing), and once in
+#   batch_loader_db_queries_total.
+#
+# cache.get_or_load uses SingleFlight for every miss; GET /products/{id}
+# loads its row through a BatchLoader (see main.py).
+
+import asyncio
+import contextvars
+
+from database import current_request
+
+
+# BatchLoaders by name, for /metrics
+loaders = {}
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0      # load() calls started
+        self.shared = 0     # callers that got the result of a call already running
+
+    async def do(self, key, load):
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.get_running_loop().create_task(load())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        # shield → a caller that is cancelled does not cancel the load of the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # nobody may be left to read the error → no "never retrieved" warning
+
+    def snapshot(self):
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+# The queries of one batch (stands in for metrics.RequestStats while it runs)
+class BatchQueries:
+    __slots__ = ("queries", "query_seconds", "key")
+
+    def __init__(self, name):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.key = ("BATCH", name)  # the "route" of its slow queries in the log
+
+
+class BatchLoader:
+    # load_many → async function(list of keys) → {key: value}; missing keys get None
+    def __init__(self, name, load_many, max_batch=500, delay_ms=0):
+        self.name = name
+        self.load_many = load_many
+        self.max_batch = max_batch
+        self.delay = delay_ms / 1000
+        self._pending = None        # key → future, for the batch being collected
+        self._waiting = None        # query counters of the requests in that batch
+        self._timer = None          # the scheduled _dispatch of that batch
+        self._loop = None
+        self.batches = 0
+        self.keys = 0
+        self.largest = 0
+        self.queries = 0
+        loaders[name] = self
+
+    async def load(self, key):
+        loop = asyncio.get_running_loop()
+        if self._pending is None or self._loop is not loop:
+            self._pending = {}
+            self._waiting = set()
+            self._loop = loop
+            if self.delay > 0:
+                self._timer = loop.call_later(self.delay, self._dispatch)
+            else:
+                self._timer = loop.call_soon(self._dispatch)
+
+        stats = current_request.get()
+        if stats is not None:
+            self._waiting.add(stats)
+
+        future = self._pending.get(key)
+        if future is None:
+            future = self._pending[key] = loop.create_future()
+            if len(self._pending) >= self.max_batch:
+                self._dispatch()
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        batch, waiting = self._pending, self._waiting
+        self._pending = self._waiting = None
+        if self._timer is not None:
+            # sent early (max_batch): the timer must not cut the NEXT batch short
+            self._timer.cancel()
+            self._timer = None
+        if not batch:
+            return
+        # own context: the queries are counted for the batch, not for the
+        # request that happened to come first; _run hands them out
+        tally = BatchQueries(self.name)
+        context = contextvars.Context()
+        context.run(current_request.set, tally)
+        self._loop.create_task(self._run(batch, waiting, tally), context=context)
+
+    async def _run(self, batch, waiting, tally):
+        self.batches += 1
+        self.keys += len(batch)
+        self.largest = max(self.largest, len(batch))
+        try:
+            values = await self.load_many(list(batch))
+        except Exception as e:
+            self._count(waiting, tally)
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    future.exception()  # the waiter may be gone already
+            return
+        self._count(waiting, tally)
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(values.get(key))
+
+    # before the results are set, so the waiters' Server-Timing includes them
+    def _count(self, waiting, tally):
+        self.queries += tally.queries
+        for stats in waiting:
+            stats.queries += tally.queries
+            stats.query_seconds += tally.query_seconds
+
+    def snapshot(self):
+        return {
+            "batches": self.batches,
+            "keys": self.keys,
+            "avg_batch_size": round(self.keys / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest,
+            "queries": self.queries,
+        }
@@ -0,0 +1,79 @@
+#this file has the STOCK ADJUSTMENT routes
+#the database does "quantity = quantity + delta" itself, in ONE UPDATE statement
+
+# Why not read → change → save?
+# ---------------------------------------------------------
+# With PUT, two pickers can both read quantity = 10, both take 1 item and both
+# save 9 — one pick is lost. And it needs two round trips to the database.
+#
+#     UPDATE "Product" SET quantity = quantity + :delta
+#     WHERE id = :id [AND quantity + :delta >= 0]
+#     RETURNING id, quantity
+#
+# runs as one atomic step in the database, so concurrent adjustments never
+# overwrite each other, and RETURNING gives back the new quantity at once.
+#
+# Every adjustment is also written to the stock ledger as an "adjustment"
+# movement (see ledger.py), in the same transaction.
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+from ledger import apply_movements, rejection_reasons
+from models import BatchStockAdjustment, StockAdjustment
+import events
+
+
+router = APIRouter()
+
+
+# ======================================================================
+# POST: Adjust the stock of many products in ONE statement
+# ======================================================================
+# Body:
+#   {"items": [{"id": 1, "delta": -2}, {"id": 7, "delta": 10}], "no_negative": true}
+#
+# The deltas are put in a CASE expression:
+#   SET quantity = quantity + CASE id WHEN 1 THEN -2 WHEN 7 THEN 10 END
+#   WHERE id IN (1, 7)
+#
+# Products that are missing, or that would go negative (with no_negative),
+# are not changed and are listed in "rejected".
+@router.post("/products/adjust")
+async def Adjust_many(body: BatchStockAdjustment, db: AsyncSession = Depends(get_db)):
+    movements = [{"product_id": item.id, "kind": "adjustment", "delta": item.delta} for item in body.items]
+
+    applied = await apply_movements(db, movements, body.no_negative)
+    await db.commit()
+
+    await events.products_changed(rows=applied.values())
+
+    refused = list({item.id for item in body.items if item.id not in applied})
+    return {
+        "applied": [{"id": id, "quantity": row["quantity"]} for id, row in applied.items()],
+        "rejected": await rejection_reasons(db, refused),
+    }
+
+
+# ======================================================================
+# POST: Adjust the stock of one product
+# ======================================================================
+# Body:
+#   {"delta": -2, "no_negative": true}
+#
+# Returns the new quantity:
+#   {"id": 1, "quantity": 8}
+@router.post("/products/{id}/adjust")
+async def Adjust_stock(id: int, body: StockAdjustment, db: AsyncSession = Depends(get_db)):
+    movement = {"product_id": id, "kind": "adjustment", "delta": body.delta}
+
+    applied = await apply_movements(db, [movement], body.no_negative)
+    await db.commit()
+
+    if id not in applied:
+        reason = (await rejection_reasons(db, [id]))[0]["reason"]
+        raise HTTPException(status_code=404 if reason == "not found" else 409, detail=reason)
+
+    await events.products_changed(rows=[applied[id]])
+    return {"id": id, "quantity": applied[id]["quantity"]}
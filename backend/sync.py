@@ -0,0 +1,219 @@
+#this file has the DELTA SYNC of the products: row versions, tombstones,
+#and GET /products/changes, so a client (frontend, POS cache) can keep a local
+#copy of the table up to date by fetching only what changed
+
+# How it works
+# ---------------------------------------------------------
+# Every write stamps the products it inserts / updates with a version
+# number (Product.version, see stamp()). A delete leaves a tombstone with
+# its version (ProductTombstone).
+#
+# The client keeps a cursor = (version, id) of the last change it applied:
+#
+#   GET /products/changes                → first sync, from the start (the whole table)
+#   GET /products/changes?since=<cursor> → only the rows changed after it
+#   {"changes": [{"op": "upsert", "version": 12, "product": {...}},
+#                {"op": "delete", "version": 13, "id": 4}],
+#    "next_cursor": "...", "has_more": false}
+#
+# The client applies the changes in order, stores next_cursor, and asks again
+# (at once while has_more, later on a timer or after a stream event).
+#
+# Which number, and when may a client see it?
+# A version is only useful if it becomes visible in order. If transaction A
+# takes 10, B takes 11 and commits first, a client that reads 11 moves its
+# cursor past 10 before A commits → A's change would never be sent.
+# So writers take their number without waiting for anybody, and the READ
+# side holds changes back until no transaction that could still write a
+# lower number is running (the watermark):
+#
+#   Postgres → version   = the writing transaction's id  (pg_current_xact_id())
+#              watermark = the oldest transaction still running
+#                          (pg_snapshot_xmin(pg_current_snapshot()))
+#              every id below it has committed or rolled back → exact.
+#   others   → version   = the clock in microseconds, set again right before
+#                          the COMMIT (restamp below), so a long transaction
+#                          (e.g. a big POST /products/batch) gets its commit time
+#              watermark = now - SYNC_SAFETY_LAG_MS (the time between the
+#                          restamp and the commit must stay below it)
+#
+# Only versions below the watermark are returned. A long running transaction
+# delays the feed (for everybody) until it ends, it never blocks a writer.
+#
+# Product and tombstone rows are read in ONE statement (UNION ALL), so both
+# come from the same snapshot of the database.
+
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from sqlalchemy import BigInteger, delete, event, insert, literal, literal_column, null, select, tuple_, union_all, update
+from sqlalchemy.orm import Session
+
+from pagination import decode_cursor, encode_cursor
+from replicas import open_read_session
+import DB_ORM_Model
+
+
+router = APIRouter()
+
+Product = DB_ORM_Model.Product
+ProductTombstone = DB_ORM_Model.ProductTombstone
+
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 5000
+
+# clock versions (not Postgres): how long a write transaction may take to commit
+SYNC_SAFETY_LAG_MS = int(os.getenv("SYNC_SAFETY_LAG_MS", "2000"))
+
+# the writing transaction's id (xid8; taken once, the same for every statement)
+PG_VERSION = literal_column("pg_current_xact_id()::text::bigint", BigInteger)
+# the oldest transaction id still running
+PG_WATERMARK = literal_column("pg_snapshot_xmin(pg_current_snapshot())::text::bigint", BigInteger)
+
+
+def now_us():
+    return time.time_ns() // 1000
+
+
+# The version for a write (inside the caller's transaction)
+# ---------------------------------------------------------
+# An SQL expression on Postgres, a number elsewhere; no statement, no lock.
+# A clock version is remembered on the session, for the restamp at the commit.
+def next_version(db):
+    if db.get_bind().dialect.name == "postgresql":
+        return PG_VERSION
+    version = now_us()
+    db.info.setdefault("sync_versions", set()).add(version)
+    return version
+
+
+# Clock versions: give the rows of the transaction the time of the commit
+# ---------------------------------------------------------
+# Runs for the commit of a session (the async sessions use a sync Session
+# inside, so the statements can be sent from here), not for a SAVEPOINT. Without it, a row stamped
+# at the start of a long transaction could become visible only after the
+# watermark had passed its version, and a client would never get it.
+@event.listens_for(Session, "before_commit")
+def restamp(session):
+    if session.in_nested_transaction():
+        return
+    versions = session.info.pop("sync_versions", None)
+    if not versions:
+        return
+    session.flush()  # ORM changes (db.add, attribute sets) are written first
+    now = now_us()
+    for table in (Product, ProductTombstone):
+        session.execute(
+            update(table).where(table.version.in_(versions)).values(version=now),
+            execution_options={"synchronize_session": False},
+        )
+
+
+# the transaction is over (rolled back) → nothing of it to restamp
+@event.listens_for(Session, "after_transaction_end")
+def forget_versions(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("sync_versions", None)
+
+
+# naive UTC, like the ledger times
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Columns to set on every product a write touches
+# ---------------------------------------------------------
+# e.g. update(Product).values(**changes, **stamp(db))
+def stamp(db):
+    return {"version": next_version(db), "updated_at": utcnow()}
+
+
+# Leave tombstones for deleted products (same transaction as the delete)
+# ---------------------------------------------------------
+# A product deleted, created again and deleted again keeps one tombstone
+# with the latest version.
+async def record_deletes(db, ids, version):
+    ids = list(ids)
+    if not ids:
+        return
+    await db.execute(delete(ProductTombstone).where(ProductTombstone.product_id.in_(ids)))
+    await db.execute(
+        insert(ProductTombstone).values(version=version, deleted_at=utcnow()),
+        [{"product_id": id} for id in ids],
+    )
+
+
+# Changes below this version can be sent (see above)
+def watermark(db):
+    if db.get_bind().dialect.name == "postgresql":
+        return PG_WATERMARK
+    return now_us() - SYNC_SAFETY_LAG_MS * 1000
+
+
+# The changes after (version, id), at most limit + 1 of them, oldest first
+# ---------------------------------------------------------
+# Each side is cut to limit + 1 rows by its own (version, id) index,
+# then the two short lists are merged.
+def changes_query(version, last_id, limit, below):
+    after = tuple_(literal(version, BigInteger), last_id)  # versions go beyond 32 bit
+    products = (
+        select(Product.version.label("version"), Product.id.label("id"), literal("upsert").label("op"),
+               Product.name, Product.description, Product.price, Product.quantity)
+        .where(tuple_(Product.version, Product.id) > after, Product.version < below)
+        .order_by(Product.version, Product.id)
+        .limit(limit + 1)
+        .subquery()
+    )
+    tombstones = (
+        select(ProductTombstone.version.label("version"), ProductTombstone.product_id.label("id"),
+               literal("delete").label("op"), null().label("name"), null().label("description"),
+               null().label("price"), null().label("quantity"))
+        .where(tuple_(ProductTombstone.version, ProductTombstone.product_id) > after,
+               ProductTombstone.version < below)
+        .order_by(ProductTombstone.version, ProductTombstone.product_id)
+        .limit(limit + 1)
+        .subquery()
+    )
+    merged = union_all(select(products), select(tombstones)).subquery()
+    return select(merged).order_by(merged.c.version, merged.c.id).limit(limit + 1)
+
+
+def change_to_dict(row):
+    if row.op == "delete":
+        return {"op": "delete", "version": row.version, "id": row.id}
+    return {
+        "op": "upsert",
+        "version": row.version,
+        "product": {"id": row.id, "name": row.name, "description": row.description,
+                    "price": row.price, "quantity": row.quantity},
+    }
+
+
+# ======================================================================
+# GET: Changes since a cursor (delta sync)
+# ======================================================================
+# since → next_cursor of the previous call, or nothing for a full first sync
+@router.get("/products/changes")
+async def Product_changes(
+    since: Optional[str] = None,
+    limit: int = Query(DEFAULT_CHANGES_LIMIT, ge=1, le=MAX_CHANGES_LIMIT),
+):
+    version, last_id = decode_cursor(since, Product.version, Product.id) if since else (-1, 0)
+
+    # a replica is fine: it has a prefix of the primary's commits, and on
+    # Postgres its snapshot still counts the transactions it has not replayed
+    # yet as running (clock versions: keep the replica lag below SYNC_SAFETY_LAG_MS)
+    async with open_read_session() as db:
+        rows = (await db.execute(changes_query(version, last_id, limit, watermark(db)))).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        since = encode_cursor(rows[-1].version, rows[-1].id)
+    elif since is None:
+        since = encode_cursor(-1, 0)
+
+    return {"changes": [change_to_dict(row) for row in rows], "next_cursor": since, "has_more": has_more}
@@ -0,0 +1,32 @@
+#shared setup of the tests: every test gets its own SQLite database file
+#run them from the backend folder:  python -m pytest -q
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# before the app is imported (read at import time)
+os.environ.setdefault("DATABASE_URL", "sqlite:///test.db")
+os.environ["DB_SEED_SAMPLE"] = "0"
+
+import pytest
+
+import database
+
+
+@pytest.fixture(autouse=True)
+def fresh_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "db_url", f"sqlite:///{tmp_path / 'test.db'}")
+
+
+# Run one async test body on its own event loop. The engine (and its pooled
+# connections) belongs to that loop, so it is closed before the loop ends.
+def run(test):
+    async def wrapped():
+        try:
+            return await test()
+        finally:
+            await database.dispose_engine()
+    return asyncio.run(wrapped())
@@ -0,0 +1,83 @@
+#tests of the admission control (admission.py): the queue and slot counts
+#must come back to 0 whatever happens to the waiting requests
+
+import asyncio
+
+import pytest
+
+from conftest import run
+import admission
+
+
+def idle(controller):
+    return controller.in_flight == 0 and controller.queued == 0
+
+
+def test_admission_timeout_leaves_no_waiter():
+    controller = admission.AdmissionController(limit=1, max_queue=5, max_wait_ms=20)
+
+    async def test():
+        assert await controller.acquire(admission.NORMAL)
+        refused = await asyncio.gather(*[controller.acquire(admission.NORMAL) for _ in range(3)])
+        assert controller.queued == 0
+        controller.release()
+        return refused
+
+    assert run(test) == [False] * 3
+    assert idle(controller)
+    assert controller.shed[admission.NORMAL, "timeout"] == 3
+
+
+def test_admission_cancelled_waiter():
+    controller = admission.AdmissionController(limit=1, max_queue=5, max_wait_ms=1000)
+
+    async def test():
+        assert await controller.acquire(admission.NORMAL)
+
+        # cancelled while waiting → leaves the queue
+        waiter = asyncio.create_task(controller.acquire(admission.NORMAL))
+        await asyncio.sleep(0.01)
+        assert controller.queued == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.queued == 0
+
+        # cancelled just after a slot was handed to it → either it passes the
+        # slot on, or (wait_for saw the result first) it returns with the slot
+        waiter = asyncio.create_task(controller.acquire(admission.NORMAL))
+        await asyncio.sleep(0.01)
+        controller.release()
+        waiter.cancel()
+        try:
+            assert await waiter is True
+        except asyncio.CancelledError:
+            pass
+        else:
+            controller.release()
+
+    run(test)
+    assert idle(controller)
+
+
+def test_admission_drops_lower_priority_when_full():
+    controller = admission.AdmissionController(limit=1, max_queue=1, max_wait_ms=1000)
+
+    async def test():
+        assert await controller.acquire(admission.NORMAL)
+        low = asyncio.create_task(controller.acquire(admission.LOW))
+        await asyncio.sleep(0.01)
+        high = asyncio.create_task(controller.acquire(admission.HIGH))
+        await asyncio.sleep(0.01)
+        assert await low is False
+        assert controller.queued == 1
+
+        assert await controller.acquire(admission.LOW) is False  # queue full, nothing lower to drop
+        controller.release()
+        assert await high is True
+        controller.release()
+
+    run(test)
+    assert idle(controller)
+    assert controller.shed[admission.LOW, "dropped for higher priority"] == 1
+    assert controller.shed[admission.LOW, "queue full"] == 1
@@ -0,0 +1,54 @@
+#tests of the response cache (cache.py)
+
+import asyncio
+
+from conftest import run
+import cache
+
+
+# Every call waits for one loop turn first, like a round trip to Redis
+class RoundTrips:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        method = getattr(self.backend, name)
+
+        async def call(*args, **kwargs):
+            await asyncio.sleep(0)
+            return await method(*args, **kwargs)
+        return call
+
+
+def test_load_that_overlaps_a_write_is_not_stored(monkeypatch):
+    monkeypatch.setattr(cache, "cache", RoundTrips(cache.MemoryCache()))
+    key = cache.product_key(7)
+
+    async def test():
+        version = await cache.products_version()
+        read_done = asyncio.Event()
+        write_done = asyncio.Event()
+
+        async def load_old_row():
+            read_done.set()
+            await write_done.wait()  # the write commits and invalidates meanwhile
+            return b"old row"
+
+        loading = asyncio.create_task(cache.get_or_load(key, load_old_row, version))
+        await read_done.wait()
+        write_done.set()  # the loader goes on to store while the write invalidates
+        await cache.invalidate_products([7])
+        return await loading, await cache.cache.get(key)
+
+    assert run(test) == (b"old row", None)
+
+
+def test_tick_drops_the_keys_and_moves_the_clock_forward():
+    async def test():
+        before = await cache.products_version()
+        await cache.cache.set(cache.product_key(8), b"row")
+        await cache.invalidate_products([8])
+        return before, await cache.products_version(), await cache.cache.get(cache.product_key(8))
+
+    before, after, row = run(test)
+    assert after > before and row is None
@@ -0,0 +1,68 @@
+#tests of the keyset pagination of GET /products (pagination.py)
+
+import httpx
+import pytest
+from sqlalchemy import insert
+
+from conftest import run
+from database import open_session
+from pagination import encode_cursor
+import DB_ORM_Model
+import main
+
+
+# names / prices with NULLs (the legacy columns allow them)
+ROWS = [
+    {"id": 1, "name": "b", "description": "d", "price": 20, "quantity": 1},
+    {"id": 2, "name": "a", "description": "d", "price": None, "quantity": 1},
+    {"id": 3, "name": None, "description": "d", "price": 10, "quantity": 1},
+    {"id": 4, "name": None, "description": "d", "price": None, "quantity": 1},
+    {"id": 5, "name": "c", "description": "d", "price": 10, "quantity": 1},
+    {"id": 6, "name": None, "description": "d", "price": 30, "quantity": 1},
+]
+
+
+async def walk(client, sort, order, limit):
+    ids, cursor = [], None
+    while True:
+        params = {"sort": sort, "order": order, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        page = (await client.get("/products", params=params)).json()
+        ids += [p["id"] for p in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("sort, order, expected", [
+    ("name", "asc", [2, 1, 5, 3, 4, 6]),
+    ("name", "desc", [6, 4, 3, 5, 1, 2]),
+    ("price", "asc", [3, 5, 1, 6, 2, 4]),
+    ("price", "desc", [4, 2, 6, 1, 5, 3]),
+])
+def test_pages_go_through_null_sort_values(sort, order, expected):
+    async def test():
+        await main.init_db()
+        async with open_session() as db:
+            await db.execute(insert(DB_ORM_Model.Product), ROWS)
+            await db.commit()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return [await walk(client, sort, order, limit) for limit in (1, 2, 4)]
+
+    assert run(test) == [expected] * 3
+
+
+@pytest.mark.parametrize("sort, value, id", [
+    ("price", "x", 1),        # text for a number column
+    ("name", 5, 1),           # number for a text column
+    ("price", 10**12, 1),     # beyond the 32 bit column
+    ("id", 1, True),
+])
+def test_cursor_that_does_not_fit_is_a_400(sort, value, id):
+    async def test():
+        await main.init_db()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.get("/products", params={"sort": sort, "cursor": encode_cursor(value, id)})
+
+    assert run(test).status_code == 400
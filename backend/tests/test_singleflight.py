@@ -0,0 +1,101 @@
+#tests of the request coalescing helpers (singleflight.py)
+
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from conftest import run
+from database import current_request, open_session
+import metrics
+import singleflight
+
+
+def test_single_flight_survives_a_cancelled_caller():
+    flights = singleflight.SingleFlight()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "row"
+
+    async def test():
+        first = asyncio.create_task(flights.do("key", load))
+        await asyncio.sleep(0)
+        others = [asyncio.create_task(flights.do("key", load)) for _ in range(3)]
+        await asyncio.sleep(0)
+        first.cancel()
+        results = await asyncio.gather(*others)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return results
+
+    assert run(test) == ["row"] * 3
+    assert len(calls) == 1
+    assert flights.snapshot() == {"calls": 1, "shared": 3, "in_flight": 0}
+
+
+def test_single_flight_error_reaches_every_caller():
+    flights = singleflight.SingleFlight()
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise LookupError("gone")
+
+    async def test():
+        return await asyncio.gather(*[flights.do("key", load) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(r, LookupError) for r in run(test))
+    assert flights.snapshot()["in_flight"] == 0
+
+
+def test_batch_loader_merges_keys_and_counts_the_query_for_every_waiter():
+    calls = []
+
+    async def load_many(keys):
+        calls.append(sorted(keys))
+        async with open_session() as db:
+            await db.execute(text("SELECT 1"))
+        return {key: key * 10 for key in keys if key != 3}
+
+    loader = singleflight.BatchLoader("test_loader", load_many)
+
+    async def request(key):
+        stats = metrics.RequestStats({"method": "GET"})
+        current_request.set(stats)  # the task's own context, like MetricsMiddleware
+        return await loader.load(key), stats.queries
+
+    async def test():
+        return await asyncio.gather(*[request(key) for key in (1, 2, 3, 2)])
+
+    results = run(test)
+    assert calls == [[1, 2, 3]]
+    assert results == [(10, 1), (20, 1), (None, 1), (20, 1)]
+    assert loader.snapshot()["queries"] == 1
+    del singleflight.loaders["test_loader"]
+
+
+def test_full_batch_does_not_leave_its_timer_to_the_next_one():
+    calls = []
+
+    async def load_many(keys):
+        calls.append((sorted(keys), asyncio.get_running_loop().time()))
+        return {key: key for key in keys}
+
+    loader = singleflight.BatchLoader("test_timer", load_many, max_batch=2, delay_ms=100)
+
+    async def test():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        assert await asyncio.gather(loader.load(1), loader.load(2)) == [1, 2]  # full → sent at once
+        await asyncio.sleep(0.06)
+        second = loop.time()
+        assert await loader.load(3) == 3  # a new batch: waits its own delay
+        return started, second
+
+    started, second = run(test)
+    del singleflight.loaders["test_timer"]
+    assert [keys for keys, _ in calls] == [[1, 2], [3]]
+    assert calls[0][1] - started < 0.05
+    assert calls[1][1] - second >= 0.095
@@ -0,0 +1,63 @@
+#tests of the delta sync (sync.py, GET /products/changes)
+
+import asyncio
+
+import httpx
+from sqlalchemy import select
+
+from conftest import run
+from database import open_session
+import DB_ORM_Model
+import batch
+import main
+import sync
+
+
+LAG_MS = 200
+
+
+# A client may move its cursor past every version below the watermark
+# (now - SYNC_SAFETY_LAG_MS), so a row must not become visible with a version
+# below it. Here a POST /products/batch transaction takes 3x longer than the
+# lag: its rows must still carry a version from (about) the commit.
+def test_long_transaction_is_not_skipped_by_the_feed(monkeypatch):
+    monkeypatch.setattr(sync, "SYNC_SAFETY_LAG_MS", LAG_MS)
+    write_chunk = batch.write_chunk
+
+    async def slow_write_chunk(db, stmt, chunk):
+        await write_chunk(db, stmt, chunk)
+        await asyncio.sleep(LAG_MS * 3 / 4 / 1000)
+
+    monkeypatch.setattr(batch, "write_chunk", slow_write_chunk)
+    rows = [{"id": id, "name": f"p{id}", "description": "d", "price": 1, "quantity": 1} for id in range(1, 5)]
+
+    async def test():
+        await main.init_db()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            started = sync.now_us()
+            response = await client.post("/products/batch", params={"chunk_size": 1}, json=rows)
+            committed = sync.now_us()
+            assert response.json()["written"] == 4
+
+            async with open_session() as db:
+                versions = (await db.scalars(select(DB_ORM_Model.Product.version))).all()
+
+            await asyncio.sleep(LAG_MS / 1000)
+            changes = (await client.get("/products/changes")).json()["changes"]
+        return started, committed, versions, changes
+
+    started, committed, versions, changes = run(test)
+    assert committed - started > 3 * LAG_MS * 1000
+    assert all(version > committed - LAG_MS * 1000 for version in versions)
+    assert sorted(change["product"]["id"] for change in changes) == [1, 2, 3, 4]
+
+
+def test_rolled_back_versions_are_not_restamped_later():
+    async def test():
+        await main.init_db()
+        async with open_session() as db:
+            sync.next_version(db)
+            await db.rollback()
+            return db.info.get("sync_versions")
+
+    assert run(test) is None
@@ -0,0 +1,110 @@
+#tests of the group commit (writebatch.py): writes of several requests in one
+#transaction must still succeed or fail one by one
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+from sqlalchemy import insert, select, text
+
+from conftest import run
+from database import open_session
+import DB_ORM_Model
+import main
+import writebatch
+
+
+Product = DB_ORM_Model.Product
+
+
+def product(id, name="p"):
+    return {"id": id, "name": name, "description": "d", "price": 1, "quantity": 1}
+
+
+def test_duplicate_post_in_a_batch_fails_alone(monkeypatch):
+    monkeypatch.setattr(writebatch, "WRITE_BATCHING", True)
+    batcher = writebatch.WriteBatcher(max_delay_ms=50)
+    monkeypatch.setattr(writebatch, "batcher", batcher)
+
+    async def test():
+        await main.init_db()
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.post("/products", json=product(1, "first"))
+            responses = await asyncio.gather(
+                *[client.post("/products", json=product(id)) for id in range(2, 7)],
+                client.post("/products", json=product(1, "duplicate")),
+            )
+            first = (await client.get("/products/1")).json()
+            listed = (await client.get("/products", params={"sort": "id"})).json()["items"]
+        await batcher.close()
+        return responses, first, listed
+
+    responses, first, listed = run(test)
+    assert [r.status_code for r in responses] == [200] * 5 + [500]
+    assert first["name"] == "first"
+    assert [p["id"] for p in listed] == [1, 2, 3, 4, 5, 6]
+    assert batcher.largest == 6 and batcher.failed == 1
+
+
+def test_each_caller_gets_its_own_result_or_error():
+    batcher = writebatch.WriteBatcher(max_delay_ms=50)
+
+    def insert_product(id):
+        async def work(db):
+            await db.execute(insert(Product), [product(id)])
+            return id
+        return work
+
+    async def broken(db):
+        raise ValueError("bad input")
+
+    async def test():
+        async with open_session() as db:
+            await (await db.connection()).run_sync(DB_ORM_Model.Base.metadata.create_all)
+            await db.commit()
+        results = await asyncio.gather(
+            batcher.submit(insert_product(1)),
+            batcher.submit(broken),
+            batcher.submit(insert_product(1)),  # duplicate of the first one
+            batcher.submit(insert_product(2)),
+            return_exceptions=True,
+        )
+        async with open_session() as db:
+            ids = (await db.scalars(select(Product.id).order_by(Product.id))).all()
+        await batcher.close()
+        return results, ids
+
+    results, ids = run(test)
+    assert results[0] == 1 and results[3] == 2
+    assert isinstance(results[1], ValueError)
+    assert "UNIQUE" in str(results[2])
+    assert ids == [1, 2]
+    assert batcher.batches == 1
+
+
+def test_failed_commit_fails_every_caller(monkeypatch):
+    batcher = writebatch.WriteBatcher(max_delay_ms=50)
+
+    @asynccontextmanager
+    async def session_that_cannot_commit():
+        async with open_session() as db:
+            async def commit():
+                raise RuntimeError("disk full")
+            db.commit = commit
+            yield db
+
+    monkeypatch.setattr(writebatch, "open_session", session_that_cannot_commit)
+
+    async def ok(db):
+        await db.execute(text("SELECT 1"))
+        return "ok"
+
+    async def test():
+        results = await asyncio.gather(*[batcher.submit(ok) for _ in range(3)], return_exceptions=True)
+        await batcher.close()
+        return results
+
+    results = run(test)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert batcher.failed == 3
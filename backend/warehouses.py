@@ -0,0 +1,306 @@
+#this file has the MULTI-WAREHOUSE stock routes
+#every warehouse keeps its own stock per product, in its own partition
+#of the WarehouseStock table (see DB_ORM_Model.py), plus totals over all of them
+
+# How it works
+# ---------------------------------------------------------
+#   POST /warehouses                                   → new warehouse (+ its partition in Postgres)
+#   GET  /warehouses                                   → all warehouses
+#   GET  /warehouses/rollup                            → products and units per warehouse + grand total
+#   GET  /warehouses/{id}/stock?cursor=...             → stock of one warehouse, page by page
+#   GET / PUT / DELETE /warehouses/{id}/stock/{product_id}
+#   POST /warehouses/{id}/stock/{product_id}/adjust    → quantity = quantity + delta (one UPDATE)
+#   POST /warehouses/{id}/adjust                       → many products of one warehouse, one UPDATE
+#   GET  /products/{id}/locations                      → where a product is, and how many in total
+#
+# Every statement of a location route has "warehouse_id = :id" in its WHERE,
+# so Postgres only opens the partition of that warehouse: a busy warehouse
+# never scans, locks or bloats the rows of another one.
+# The adjustments work like stock.py: the database adds the delta itself,
+# so concurrent pickers never overwrite each other.
+#
+# Warehouse stock is separate from Product.quantity and from the stock ledger
+# (ledger.py keeps one history per product, not per location).
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import case, delete, func, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from batch import UPSERT_BUILDERS
+from database import get_db
+from ledger import utcnow
+from models import BatchStockAdjustment, StockAdjustment, StockLevel, Warehouse, WarehouseStockPage
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, encode_cursor, keyset_query
+from replicas import get_read_db
+import DB_ORM_Model
+
+
+router = APIRouter()
+
+WarehouseRow = DB_ORM_Model.Warehouse
+WarehouseStock = DB_ORM_Model.WarehouseStock
+
+
+async def check_warehouse(db, warehouse_id):
+    if await db.get(WarehouseRow, warehouse_id) is None:
+        raise HTTPException(status_code=404, detail="warehouse not found")
+
+
+def stock_item(row):
+    return {"product_id": row.product_id, "quantity": row.quantity}
+
+
+# Which products of this warehouse were refused by an adjustment, and why
+async def rejection_reasons(db, warehouse_id, product_ids):
+    if not product_ids:
+        return []
+    stocked = set((await db.execute(
+        select(WarehouseStock.product_id)
+        .where(WarehouseStock.warehouse_id == warehouse_id, WarehouseStock.product_id.in_(product_ids))
+    )).scalars())
+    return [
+        {"id": id, "reason": "insufficient stock" if id in stocked else "not stocked here"}
+        for id in product_ids
+    ]
+
+
+# ======================================================================
+# POST: Add a warehouse
+# ======================================================================
+# Postgres: the warehouse gets its own partition in the same transaction,
+#   CREATE TABLE "WarehouseStock_3" PARTITION OF "WarehouseStock" FOR VALUES IN (3)
+@router.post("/warehouses")
+async def Add_warehouse(warehouse: Warehouse, db: AsyncSession = Depends(get_db)):
+    if warehouse.id <= 0:
+        raise HTTPException(status_code=422, detail="warehouse id must be > 0")
+
+    db.add(WarehouseRow(**warehouse.model_dump()))
+    try:
+        await db.flush()
+        if db.get_bind().dialect.name == "postgresql":
+            # the id is an int checked above, so it can be put into the DDL as is
+            await db.execute(text(
+                f'CREATE TABLE IF NOT EXISTS "WarehouseStock_{warehouse.id}" '
+                f'PARTITION OF "WarehouseStock" FOR VALUES IN ({warehouse.id})'
+            ))
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="warehouse id or code already exists")
+
+    return warehouse.model_dump()
+
+
+# ======================================================================
+# GET: All warehouses
+# ======================================================================
+@router.get("/warehouses")
+async def All_warehouses(db: AsyncSession = Depends(get_read_db)):
+    rows = (await db.execute(
+        select(WarehouseRow.id, WarehouseRow.code, WarehouseRow.name).order_by(WarehouseRow.id)
+    )).mappings().all()
+    return [dict(row) for row in rows]
+
+
+# ======================================================================
+# GET: Stock totals per warehouse (rollup over all locations)
+# ======================================================================
+# Response:
+#   {"warehouses": [{"id": 1, "code": "BLR-1", "products": 1200, "units": 53000}, ...],
+#    "total": {"products": 1500, "units": 81000}}
+# "products" counts the products with stock > 0.
+@router.get("/warehouses/rollup")
+async def Warehouse_rollup(db: AsyncSession = Depends(get_read_db)):
+    per_warehouse = (
+        select(
+            WarehouseStock.warehouse_id,
+            func.count().filter(WarehouseStock.quantity > 0).label("products"),
+            func.coalesce(func.sum(WarehouseStock.quantity), 0).label("units"),
+        )
+        .group_by(WarehouseStock.warehouse_id)
+        .subquery()
+    )
+    rows = (await db.execute(
+        select(WarehouseRow.id, WarehouseRow.code,
+               func.coalesce(per_warehouse.c.products, 0).label("products"),
+               func.coalesce(per_warehouse.c.units, 0).label("units"))
+        .outerjoin(per_warehouse, per_warehouse.c.warehouse_id == WarehouseRow.id)
+        .order_by(WarehouseRow.id)
+    )).mappings().all()
+
+    total_products = await db.scalar(
+        select(func.count(func.distinct(WarehouseStock.product_id))).where(WarehouseStock.quantity > 0)
+    )
+    return {
+        "warehouses": [dict(row) for row in rows],
+        "total": {"products": total_products or 0, "units": sum(row["units"] for row in rows)},
+    }
+
+
+# ======================================================================
+# GET: Stock of one warehouse (keyset pages by product id)
+# ======================================================================
+@router.get("/warehouses/{warehouse_id}/stock", response_model=WarehouseStockPage)
+async def Warehouse_stock(
+    warehouse_id: int,
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    await check_warehouse(db, warehouse_id)
+
+    stmt = select(WarehouseStock.product_id, WarehouseStock.quantity).where(
+        WarehouseStock.warehouse_id == warehouse_id
+    )
+    stmt = keyset_query(stmt, WarehouseStock.product_id, WarehouseStock.product_id, "asc", cursor, limit)
+    rows = (await db.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].product_id, rows[-1].product_id)
+
+    return {"items": [stock_item(row) for row in rows], "next_cursor": next_cursor}
+
+
+# ======================================================================
+# GET: Stock of one product in one warehouse
+# ======================================================================
+@router.get("/warehouses/{warehouse_id}/stock/{product_id}")
+async def Warehouse_stock_item(warehouse_id: int, product_id: int, db: AsyncSession = Depends(get_read_db)):
+    row = (await db.execute(
+        select(WarehouseStock.product_id, WarehouseStock.quantity)
+        .where(WarehouseStock.warehouse_id == warehouse_id, WarehouseStock.product_id == product_id)
+    )).first()
+    if row is None:
+        await check_warehouse(db, warehouse_id)
+        raise HTTPException(status_code=404, detail="not stocked here")
+    return stock_item(row)
+
+
+# ======================================================================
+# PUT: Set the stock of one product in one warehouse (e.g. after a count)
+# ======================================================================
+# INSERT ... ON CONFLICT (warehouse_id, product_id) DO UPDATE → creates or replaces the row.
+@router.put("/warehouses/{warehouse_id}/stock/{product_id}")
+async def Set_warehouse_stock(warehouse_id: int, product_id: int, body: StockLevel,
+                              db: AsyncSession = Depends(get_db)):
+    await check_warehouse(db, warehouse_id)
+
+    builder = UPSERT_BUILDERS.get(db.get_bind().dialect.name)
+    if builder is None:
+        raise HTTPException(status_code=501, detail="not supported on this database")
+
+    stmt = builder(WarehouseStock.__table__).values(
+        warehouse_id=warehouse_id, product_id=product_id, quantity=body.quantity, updated_at=utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[WarehouseStock.warehouse_id, WarehouseStock.product_id],
+        set_={"quantity": stmt.excluded.quantity, "updated_at": stmt.excluded.updated_at},
+    )
+    await db.execute(stmt)
+    await db.commit()
+    return {"product_id": product_id, "quantity": body.quantity}
+
+
+# ======================================================================
+# DELETE: Remove a product from one warehouse
+# ======================================================================
+@router.delete("/warehouses/{warehouse_id}/stock/{product_id}")
+async def Delete_warehouse_stock(warehouse_id: int, product_id: int, db: AsyncSession = Depends(get_db)):
+    deleted = (await db.execute(
+        delete(WarehouseStock)
+        .where(WarehouseStock.warehouse_id == warehouse_id, WarehouseStock.product_id == product_id)
+        .returning(WarehouseStock.product_id)
+    )).first()
+    await db.commit()
+
+    if deleted is None:
+        await check_warehouse(db, warehouse_id)
+        raise HTTPException(status_code=404, detail="not stocked here")
+    return {"message": "removed from warehouse"}
+
+
+# ======================================================================
+# POST: Adjust the stock of one product in one warehouse
+# ======================================================================
+# Body: {"delta": -2, "no_negative": true}  →  {"product_id": 1, "quantity": 8}
+@router.post("/warehouses/{warehouse_id}/stock/{product_id}/adjust")
+async def Adjust_warehouse_stock(warehouse_id: int, product_id: int, body: StockAdjustment,
+                                 db: AsyncSession = Depends(get_db)):
+    stmt = (
+        update(WarehouseStock)
+        .where(WarehouseStock.warehouse_id == warehouse_id, WarehouseStock.product_id == product_id)
+        .values(quantity=WarehouseStock.quantity + body.delta, updated_at=utcnow())
+        .returning(WarehouseStock.product_id, WarehouseStock.quantity)
+    )
+    if body.no_negative:
+        stmt = stmt.where(WarehouseStock.quantity + body.delta >= 0)
+
+    row = (await db.execute(stmt)).first()
+    await db.commit()
+
+    if row is None:
+        await check_warehouse(db, warehouse_id)
+        reason = (await rejection_reasons(db, warehouse_id, [product_id]))[0]["reason"]
+        raise HTTPException(status_code=404 if reason == "not stocked here" else 409, detail=reason)
+    return stock_item(row)
+
+
+# ======================================================================
+# POST: Adjust many products of one warehouse in ONE statement
+# ======================================================================
+# Body: {"items": [{"id": 1, "delta": -2}, {"id": 7, "delta": 10}], "no_negative": true}
+#   SET quantity = quantity + CASE product_id WHEN 1 THEN -2 WHEN 7 THEN 10 END
+#   WHERE warehouse_id = :id AND product_id IN (1, 7)
+@router.post("/warehouses/{warehouse_id}/adjust")
+async def Adjust_warehouse_many(warehouse_id: int, body: BatchStockAdjustment, db: AsyncSession = Depends(get_db)):
+    await check_warehouse(db, warehouse_id)
+
+    deltas = {}
+    for item in body.items:
+        deltas[item.id] = deltas.get(item.id, 0) + item.delta
+    if not deltas:
+        return {"applied": [], "rejected": []}
+
+    delta = case(deltas, value=WarehouseStock.product_id)
+    stmt = (
+        update(WarehouseStock)
+        .where(WarehouseStock.warehouse_id == warehouse_id, WarehouseStock.product_id.in_(deltas))
+        .values(quantity=WarehouseStock.quantity + delta, updated_at=utcnow())
+        .returning(WarehouseStock.product_id, WarehouseStock.quantity)
+    )
+    if body.no_negative:
+        stmt = stmt.where(WarehouseStock.quantity + delta >= 0)
+
+    applied = {row.product_id: row.quantity for row in (await db.execute(stmt)).all()}
+    await db.commit()
+
+    refused = [id for id in deltas if id not in applied]
+    return {
+        "applied": [{"id": id, "quantity": quantity} for id, quantity in applied.items()],
+        "rejected": await rejection_reasons(db, warehouse_id, refused),
+    }
+
+
+# ======================================================================
+# GET: Where is a product, and how many in total (rollup over all locations)
+# ======================================================================
+# Response:
+#   {"product_id": 7, "total": 42,
+#    "locations": [{"warehouse_id": 1, "code": "BLR-1", "quantity": 40}, ...]}
+# Uses the product_id index of every partition.
+@router.get("/products/{product_id}/locations")
+async def Product_locations(product_id: int, db: AsyncSession = Depends(get_read_db)):
+    rows = (await db.execute(
+        select(WarehouseStock.warehouse_id, WarehouseRow.code, WarehouseStock.quantity)
+        .join(WarehouseRow, WarehouseRow.id == WarehouseStock.warehouse_id)
+        .where(WarehouseStock.product_id == product_id)
+        .order_by(WarehouseStock.warehouse_id)
+    )).mappings().all()
+
+    locations = [dict(row) for row in rows]
+    return {"product_id": product_id, "total": sum(row["quantity"] for row in locations), "locations": locations}
@@ -0,0 +1,176 @@
+#this file has the GROUP COMMIT of single-product writes (opt-in)
+#many small writes that arrive at the same time share ONE transaction,
+#so they pay for one commit (one fsync) instead of one each
+
+# How it works
+# ---------------------------------------------------------
+# WRITE_BATCHING=1 turns it on. Then POST / PUT / DELETE /products/... do not
+# commit by themselves, they hand their database work to the batcher:
+#
+#   request A ─┐
+#   request B ─┼─► queue ─► flusher: BEGIN
+#   request C ─┘                       SAVEPOINT; work of A; RELEASE
+#                                      SAVEPOINT; work of B; RELEASE
+#                                      SAVEPOINT; work of C; ROLLBACK TO SAVEPOINT  ← C failed
+#                                    COMMIT
+#                         A and B get their result, C gets its own error
+#
+# The flusher starts a batch with the first waiting write, and collects more
+# for up to WRITE_BATCH_MAX_DELAY_MS, or until WRITE_BATCH_MAX_SIZE writes are
+# in it. While a batch is being committed the next one fills up.
+# Every request still answers only AFTER its commit, so the API does not change;
+# a single write just waits a few ms longer when the server is quiet.
+#
+# Without WRITE_BATCHING the same work runs in its own session and commits
+# at once, like before.
+
+import asyncio
+import contextvars
+import os
+
+from fastapi import APIRouter
+
+from database import open_session
+
+
+router = APIRouter()
+
+WRITE_BATCHING = os.getenv("WRITE_BATCHING", "0") == "1"
+WRITE_BATCH_MAX_DELAY_MS = float(os.getenv("WRITE_BATCH_MAX_DELAY_MS", "5"))
+WRITE_BATCH_MAX_SIZE = int(os.getenv("WRITE_BATCH_MAX_SIZE", "100"))
+
+
+STOP = object()  # queued by close(): flush what came before, then end
+
+
+class WriteBatcher:
+    def __init__(self, max_size=WRITE_BATCH_MAX_SIZE, max_delay_ms=WRITE_BATCH_MAX_DELAY_MS):
+        self.max_size = max_size
+        self.max_delay = max_delay_ms / 1000
+        self._queue = None
+        self._task = None
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.largest = 0
+
+    # Queue one write and wait until it is committed
+    # ---------------------------------------------------------
+    # work → async function work(db) doing the statements of ONE request.
+    # Returns what work() returned, or raises what work() (or the commit) raised.
+    async def submit(self, work):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            # empty context: the flusher works for many requests, its queries
+            # must not be counted for the request that happened to start it (metrics.py)
+            self._task = contextvars.Context().run(loop.create_task, self._run())
+
+        future = loop.create_future()
+        self._queue.put_nowait((work, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+
+            while len(batch) < self.max_size and batch[-1][0] is not STOP:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            if batch[-1][0] is STOP:
+                _, stopped = batch.pop()
+                if batch:
+                    await self._flush(batch)
+                stopped.set_result(None)
+                return
+
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        self.batches += 1
+        self.writes += len(batch)
+        self.largest = max(self.largest, len(batch))
+
+        done = []
+        try:
+            async with open_session() as db:
+                for work, future in batch:
+                    if future.done():  # the client went away before its turn
+                        continue
+                    try:
+                        async with db.begin_nested():  # SAVEPOINT → a failing write only undoes itself
+                            result = await work(db)
+                    except Exception as e:
+                        self.failed += 1
+                        future.set_exception(e)
+                    else:
+                        done.append((future, result))
+
+                await db.commit()
+        except Exception as e:
+            # no connection / the commit itself failed → nothing of this batch was saved
+            self.failed += len(done)
+            for future, _ in done:
+                if not future.done():
+                    future.set_exception(e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result in done:
+            if not future.done():
+                future.set_result(result)
+
+    # Stop the flusher (on shutdown), after the writes already queued are saved
+    async def close(self):
+        if self._task is None or self._task.done():
+            return
+        stopped = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((STOP, stopped))
+        await stopped
+
+    def snapshot(self):
+        return {
+            "enabled": WRITE_BATCHING,
+            "max_delay_ms": self.max_delay * 1000,
+            "max_size": self.max_size,
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed": self.failed,
+            "avg_batch_size": round(self.writes / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest,
+        }
+
+
+batcher = WriteBatcher()
+
+
+# Run the database work of one write request
+# ---------------------------------------------------------
+# Batched (WRITE_BATCHING=1) or in its own transaction. Either way, when this
+# returns the work is committed, so the caller can publish the change.
+async def run_write(work):
+    if WRITE_BATCHING:
+        return await batcher.submit(work)
+
+    async with open_session() as db:
+        result = await work(db)
+        await db.commit()
+        return result
+
+
+# ======================================================================
+# GET: Group commit statistics
+# ======================================================================
+@router.get("/db/write-batches")
+async def Write_batch_stats():
+    return batcher.snapshot()
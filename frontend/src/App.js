@@ -1,12 +1,45 @@
-import React, { useEffect, useState, useMemo } from "react";
+import React, { useCallback, useEffect, useRef, useState } from "react";
 import axios from "axios";
 import "./App.css";
 import TaglineSection from "./TaglineSection";
 
+const API_URL = "http://localhost:8000";
+
+// withCredentials → the browser keeps and sends the backend's cookies on
+// these cross-origin calls (3000 → 8000). The "read_primary_until" cookie set
+// after a write makes the next reads go to the primary database, so the table
+// shows our own change even when a read replica lags (see backend/replicas.py).
 const api = axios.create({
-  baseURL: "http://localhost:8000",
+  baseURL: API_URL,
+  withCredentials: true,
 });
 
+// How many products the backend sends in one page
+const PAGE_SIZE = 50;
+
+// Compare two products the same way the backend sorts them
+const compareBy = (field, direction) => (a, b) => {
+  let aVal = a[field];
+  let bVal = b[field];
+  if (field === "name") {
+    aVal = String(aVal);
+    bVal = String(bVal);
+  }
+  let result = aVal < bVal ? -1 : aVal > bVal ? 1 : 0;
+  if (result === 0) result = a.id - b.id; // id breaks ties, like the backend
+  return direction === "asc" ? result : -result;
+};
+
+// Does a product match the search box (same rule as the backend filter)?
+const matchesQuery = (product, query) => {
+  if (!query) return true;
+  const q = query.toLowerCase();
+  return (
+    product.name?.toLowerCase().includes(q) ||
+    product.description?.toLowerCase().includes(q)
+  );
+};
+
 function App() {
   const [products, setProducts] = useState([]);
   const [form, setForm] = useState({
@@ -23,6 +56,8 @@ function App() {
   const [filter, setFilter] = useState("");
   const [sortField, setSortField] = useState("id");
   const [sortDirection, setSortDirection] = useState("asc");
+  const [query, setQuery] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
 
   // Auto-dismiss messages after 5 seconds
   useEffect(() => {
@@ -43,12 +78,48 @@ function App() {
     }
   }, [error]);
 
-  // Fetch all products
-  const fetchProducts = async () => {
+  // Wait until the user stops typing before asking the backend to filter
+  useEffect(() => {
+    const timer = setTimeout(() => setQuery(filter.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [filter]);
+
+  // Fetch one page of products
+  // The backend does the filtering and sorting, and returns "next_cursor"
+  // which we send back to get the following page (null means last page).
+  const fetchPage = useCallback(
+    async (cursor) => {
+      const params = { limit: PAGE_SIZE, sort: sortField, order: sortDirection };
+      if (query) params.q = query;
+      if (cursor) params.cursor = cursor;
+      const res = await api.get("/products", { params });
+      return res.data;
+    },
+    [query, sortField, sortDirection]
+  );
+
+  // Reload from the first page
+  const fetchProducts = useCallback(async () => {
     setLoading(true);
     try {
-      const res = await api.get("/products/");
-      setProducts(res.data);
+      const page = await fetchPage(null);
+      setProducts(page.items);
+      setNextCursor(page.next_cursor);
+      setError("");
+    } catch (err) {
+      setError("Failed to fetch products");
+    }
+    setLoading(false);
+  }, [fetchPage]);
+
+  // Append the next page to the list
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoading(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      setProducts((prev) => [...prev, ...page.items]);
+      setNextCursor(page.next_cursor);
       setError("");
     } catch (err) {
       setError("Failed to fetch products");
@@ -56,20 +127,60 @@ function App() {
     setLoading(false);
   };
 
+  // Start again from page 1 whenever the filter or the sorting changes
   useEffect(() => {
-    // Inline initial fetch to avoid referencing external deps
-    const run = async () => {
-      setLoading(true);
-      try {
-        const res = await api.get("/products/");
-        setProducts(res.data);
-        setError("");
-      } catch (err) {
-        setError("Failed to fetch products");
+    fetchProducts();
+  }, [fetchProducts]);
+
+  // Live updates from the backend (Server-Sent Events)
+  // Every add / edit / delete — from this tab or any other — arrives here,
+  // and the loaded list is patched in place instead of downloading it again.
+  // The connection is opened once; the current sort / search / paging state is
+  // read from a ref, so changing them does not reconnect the stream.
+  const live = useRef({});
+  live.current = { fetchProducts, sortField, sortDirection, query, nextCursor };
+
+  useEffect(() => {
+    const source = new EventSource(`${API_URL}/products/stream`);
+
+    source.onmessage = (e) => {
+      const event = JSON.parse(e.data);
+      const { fetchProducts, sortField, sortDirection, query, nextCursor } = live.current;
+
+      if (event.type === "resync") {
+        fetchProducts();
+        return;
+      }
+
+      if (event.type === "delete") {
+        const gone = new Set(event.ids);
+        setProducts((prev) => prev.filter((p) => !gone.has(p.id)));
+        return;
+      }
+
+      if (event.type === "upsert") {
+        const compare = compareBy(sortField, sortDirection);
+        setProducts((prev) => {
+          const changed = new Map(event.items.map((p) => [p.id, p]));
+          const last = prev[prev.length - 1];
+          // keep the rows we have (updated), drop the ones that no longer match
+          const kept = prev
+            .map((p) => changed.get(p.id) || p)
+            .filter((p) => matchesQuery(p, query));
+          const have = new Set(kept.map((p) => p.id));
+          // new rows are added only if they belong inside the pages already loaded
+          const added = event.items.filter(
+            (p) =>
+              !have.has(p.id) &&
+              matchesQuery(p, query) &&
+              (!nextCursor || !last || compare(p, last) <= 0)
+          );
+          return [...kept, ...added].sort(compare);
+        });
       }
-      setLoading(false);
     };
-    run();
+
+    return () => source.close();
   }, []);
 
   // Handle sorting
@@ -82,41 +193,6 @@ function App() {
     }
   };
 
-  // Derived list with filter and sorting
-  const filteredProducts = useMemo(() => {
-    let filtered = products;
-    
-    // Apply filter
-    const q = filter.trim().toLowerCase();
-    if (q) {
-      filtered = products.filter((p) =>
-        String(p.id).includes(q) ||
-        p.name?.toLowerCase().includes(q) ||
-        p.description?.toLowerCase().includes(q)
-      );
-    }
-    
-    // Apply sorting
-    return filtered.sort((a, b) => {
-      let aVal = a[sortField];
-      let bVal = b[sortField];
-      
-      // Handle numeric fields
-      if (sortField === "id" || sortField === "price" || sortField === "quantity") {
-        aVal = Number(aVal);
-        bVal = Number(bVal);
-      } else {
-        // Handle string fields
-        aVal = String(aVal).toLowerCase();
-        bVal = String(bVal).toLowerCase();
-      }
-      
-      if (aVal < bVal) return sortDirection === "asc" ? -1 : 1;
-      if (aVal > bVal) return sortDirection === "asc" ? 1 : -1;
-      return 0;
-    });
-  }, [products, filter, sortField, sortDirection]);
-
   // Handle form input
   const handleChange = (e) => {
     setForm({ ...form, [e.target.name]: e.target.value });
@@ -153,7 +229,7 @@ function App() {
         setMessage("Product created successfully");
       }
       resetForm();
-      fetchProducts();
+      // no refetch: the change comes back through the live stream
     } catch (err) {
       setError(err.response?.data?.detail || "Operation failed");
     }
@@ -184,7 +260,6 @@ function App() {
     try {
       await api.delete(`/products/${id}`);
       setMessage("Product deleted successfully");
-      fetchProducts();
     } catch (err) {
       setError("Delete failed");
     }
@@ -210,11 +285,14 @@ function App() {
 
       <div className="container">
         <div className="stats">
-          <div className="chip">Total: {products.length}</div>
+          <div className="chip">
+            Showing: {products.length}
+            {nextCursor ? "+" : ""}
+          </div>
           <div className="search">
             <input
               type="text"
-              placeholder="Search by id, name or description..."
+              placeholder="Search by name or description..."
               value={filter}
               onChange={(e) => setFilter(e.target.value)}
             />
@@ -294,7 +372,7 @@ function App() {
 
           <div className="card list-card">
             <h2>Products</h2>
-            {loading ? (
+            {loading && products.length === 0 ? (
               <div className="loader">Loading...</div>
             ) : (
               <div className="scroll-x">
@@ -330,7 +408,7 @@ function App() {
                     </tr>
                   </thead>
                   <tbody>
-                    {filteredProducts.map((p) => (
+                    {products.map((p) => (
                       <tr key={p.id}>
                         <td>{p.id}</td>
                         <td className="name-cell">{p.name}</td>
@@ -351,7 +429,7 @@ function App() {
                         </td>
                       </tr>
                     ))}
-                    {filteredProducts.length === 0 && (
+                    {products.length === 0 && (
                       <tr>
                         <td colSpan={6} className="empty">
                           No products found.
@@ -360,6 +438,13 @@ function App() {
                     )}
                   </tbody>
                 </table>
+                {nextCursor && (
+                  <div className="load-more">
+                    <button className="btn" onClick={loadMore} disabled={loading}>
+                      Load more
+                    </button>
+                  </div>
+                )}
               </div>
             )}
           </div>